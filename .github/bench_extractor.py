@@ -0,0 +1,106 @@
+"""
+Benchmarks the link extractor against the old regex findall.
+
+Usage:
+    python3 .github/bench_extractor.py [payload files ...] [--size MB] [--rounds N]
+
+Payload files are raw channel/resource dumps (for example `rawResults` captured
+with the record/replay harness). Without files, a payload of the requested size
+is built from the current `proxies/` folder mixed with message-like noise.
+"""
+import argparse
+import gc
+import re
+import time
+import tracemalloc
+from glob import iglob
+from typing import Callable, List
+
+from extractor import iter_configs
+
+LEGACY_PATTERN = r'(?:vless|vmess|ss|trojan)://[^\s#]+(?:#[^\s]*)?'
+
+NOISE = (
+    "🔥 New configs for today, join @somechannel for more!\n"
+    "Support us: https://t.me/somechannel?start=1 &amp; share.\n"
+    "<br/>Speed test passed ✅ (MCI, MTN)\n"
+)
+
+
+def legacy(text: str) -> int:
+    urls = re.findall(LEGACY_PATTERN, text)[::-1]
+    joined = "\n".join(urls)
+    return len(joined.splitlines()) if joined.strip() else 0
+
+
+def streaming(text: str) -> int:
+    urls = list(iter_configs(text))
+    urls.reverse()
+    return len(urls)
+
+
+def build_payload(size_mb: float) -> str:
+    lines: List[str] = []
+    for path in iglob("proxies/**/*.txt"):
+        if "regular" in path:
+            continue
+        with open(path) as fp:
+            lines.extend(line for line in fp.read().splitlines() if line)
+
+    if not lines:
+        lines = ["vless://00000000-0000-0000-0000-000000000000@example.com:443?security=tls&amp;type=ws#demo"]
+
+    chunks: List[str] = []
+    total = 0
+    target = int(size_mb * 1024 * 1024)
+    i = 0
+    while total < target:
+        piece = NOISE + lines[i % len(lines)] + ".\n"
+        chunks.append(piece)
+        total += len(piece)
+        i += 1
+    return "".join(chunks)
+
+
+def measure(func: Callable[[str], int], text: str, rounds: int):
+    best = float("inf")
+    for _ in range(rounds):
+        gc.collect()
+        start = time.perf_counter()
+        count = func(text)
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    func(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return count, best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the link extractor.")
+    parser.add_argument("payloads", nargs="*", help="Captured payload files")
+    parser.add_argument("--size", type=float, default=16, help="Synthetic payload size in MB")
+    parser.add_argument("--rounds", type=int, default=3, help="Timing rounds, best is reported")
+    args = parser.parse_args()
+
+    if args.payloads:
+        texts = []
+        for path in args.payloads:
+            with open(path, encoding="utf-8", errors="replace") as fp:
+                texts.append(fp.read())
+        text = "\n".join(texts)
+    else:
+        text = build_payload(args.size)
+
+    print(f"Payload: {len(text) / 1024 / 1024:.1f} MB")
+    print(f"{'extractor':<12}{'links':>10}{'best (s)':>12}{'peak (MB)':>12}")
+    for name, func in (("legacy", legacy), ("streaming", streaming)):
+        count, best, peak = measure(func, text, args.rounds)
+        print(f"{name:<12}{count:>10}{best:>12.3f}{peak / 1024 / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
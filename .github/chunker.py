@@ -1,9 +1,29 @@
+import argparse
+import heapq
+import json
+import os
+import time
 from pathlib import Path
-from typing import List, TypeVar
+from typing import Callable, Dict, List, Tuple, TypeVar
 from glob import iglob
+from urllib.parse import parse_qs, urlparse
+
+from fingerprint import decode_b64, fingerprint
 
 T = TypeVar('T')
 
+# Per-config outcomes and timings from previous checker runs
+HISTORY_PATH = "data/check_history.json"
+
+# Estimated check cost in seconds of a config nothing is known about
+DEFAULT_COST = 6.0
+
+# Weight of the newest observation in the moving averages
+ALPHA = 0.5
+
+# Configs not checked for this long are dropped from the history
+HISTORY_MAX_AGE = 7 * 24 * 60 * 60
+
 def load_proxies() -> List[str]:
     configs = []
 
@@ -12,7 +32,7 @@ def load_proxies() -> List[str]:
         with open(f) as fp:
             configs.extend(fp.read().splitlines())
 
-    return configs    
+    return configs
 
 
 def chunk_evenly(data: List[T], parts: int) -> List[List[T]]:
@@ -20,22 +40,161 @@ def chunk_evenly(data: List[T], parts: int) -> List[List[T]]:
     k, m = divmod(n, parts)
     return [data[i*k + min(i, m):(i+1)*k + min(i+1, m)] for i in range(parts)]
 
+
+def transport_key(config: str) -> str:
+    """Returns the "protocol/transport" group of a config, e.g. "vless/ws"."""
+    scheme = config.split("://", 1)[0]
+
+    try:
+        if scheme == "vmess":
+            data = json.loads(decode_b64(config[len("vmess://"):]))
+            network = data.get("net") or "tcp"
+        else:
+            network = parse_qs(urlparse(config).query).get("type", ["tcp"])[0]
+    except (ValueError, TypeError, AttributeError):
+        network = "tcp"
+
+    return f"{scheme}/{network}"
+
+
+def load_history(path: str = HISTORY_PATH) -> Dict:
+    try:
+        with open(path) as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return {"configs": {}, "groups": {}, "shards": []}
+
+
+def record_history(stats_files: List[str], path: str = HISTORY_PATH) -> None:
+    """Folds the checkstats files of a run into the history."""
+    stats = []
+    for stats_file in stats_files:
+        with open(stats_file) as fp:
+            stats.append(json.load(fp))
+
+    record_stats(stats, path)
+
+
+def record_stats(shard_stats: List[Dict], path: str = HISTORY_PATH) -> None:
+    """Folds the checkstats of a run, one dict per shard, into the history."""
+    history = load_history(path)
+    configs = history.setdefault("configs", {})
+    groups = history.setdefault("groups", {})
+    now = int(time.time())
+
+    shards = []
+    outcomes = 0
+    for stats in shard_stats:
+        shards.append(stats.get("elapsed", 0))
+        outcomes += len(stats.get("results", []))
+
+        for url, ok, elapsed in stats.get("results", []):
+            cost = elapsed / 1000
+
+            key = fingerprint(url)
+            previous = configs.get(key)
+            if previous is None:
+                configs[key] = [cost, float(ok), now]
+            else:
+                configs[key] = [
+                    ALPHA * cost + (1 - ALPHA) * previous[0],
+                    ALPHA * ok + (1 - ALPHA) * previous[1],
+                    now
+                ]
+
+            group = transport_key(url)
+            average, samples = groups.get(group, [cost, 0])
+            groups[group] = [average + (cost - average) / (samples + 1), min(samples + 1, 10000)]
+
+    history["configs"] = {key: entry for key, entry in configs.items() if now - entry[2] <= HISTORY_MAX_AGE}
+    history["shards"] = shards
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as fp:
+        json.dump(history, fp, separators=(",", ":"))
+    os.replace(path + ".tmp", path)
+
+    print(f"Recorded {outcomes} outcomes "
+          f"from {len(shard_stats)} shards, actual imbalance {imbalance(shards):.2f}")
+
+
+def cost_model(history: Dict) -> Callable[[str], float]:
+    """
+    Returns a function estimating the check cost of a config in seconds.
+
+    Known configs use their own history, others the average of their
+    protocol/transport group.
+    """
+    configs = history.get("configs", {})
+    groups = history.get("groups", {})
+
+    def cost(config: str) -> float:
+        entry = configs.get(fingerprint(config))
+        if entry is not None:
+            return entry[0]
+
+        group = groups.get(transport_key(config))
+        return group[0] if group else DEFAULT_COST
+
+    return cost
+
+
+def pack_by_cost(data: List[str], parts: int, cost: Callable[[str], float]) -> Tuple[List[List[str]], List[float]]:
+    """Packs the configs into chunks of about equal total cost (longest processing time first)."""
+    weighted = sorted(((cost(config), config) for config in data), reverse=True)
+
+    chunks: List[List[str]] = [[] for _ in range(parts)]
+    loads = [(0.0, i) for i in range(parts)]
+
+    for weight, config in weighted:
+        load, i = heapq.heappop(loads)
+        chunks[i].append(config)
+        heapq.heappush(loads, (load + weight, i))
+
+    totals = [0.0] * parts
+    for load, i in loads:
+        totals[i] = load
+
+    return chunks, totals
+
+
+def imbalance(loads: List[float]) -> float:
+    """Ratio of the slowest chunk to the average one, 1.0 is perfectly balanced."""
+    loads = [load for load in loads if load]
+    if not loads:
+        return 0.0
+    return max(loads) / (sum(loads) / len(loads))
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Split the configs into chunks for the checker matrix.")
+    parser.add_argument("--parts", type=int, default=20, help="Number of chunks")
+    parser.add_argument("--history", default=HISTORY_PATH, help="Check history file")
+    parser.add_argument("--record", nargs="+", metavar="STATS", help="Record checkstats files into the history and exit")
+    args = parser.parse_args()
+
+    if args.record:
+        record_history(args.record, args.history)
+        return
 
     chunks_path = Path("chunks")
     chunks_path.mkdir(exist_ok=True)
 
     proxies = load_proxies()
+    history = load_history(args.history)
 
-    chunks = chunk_evenly(proxies, 20)
+    chunks, loads = pack_by_cost(proxies, args.parts, cost_model(history))
 
     for i, chunk in enumerate(chunks):
-        
+
         with open(chunks_path / f"chunk-{i+1}.txt", "w") as fp:
             fp.write("\n".join(chunk))
 
+    print(f"Packed {len(proxies)} configs into {args.parts} chunks, "
+          f"predicted cost {min(loads):.0f}s-{max(loads):.0f}s, predicted imbalance {imbalance(loads):.2f}")
 
-
+    if history.get("shards"):
+        print(f"Actual imbalance of the previous run: {imbalance(history['shards']):.2f}")
 
 
 if __name__ == "__main__":
@@ -1,48 +1,223 @@
+import argparse
+import hashlib
 import json
+import os
+import tempfile
 from glob import glob
-from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
 
-files = sorted(glob("byLocations/byLocation-*.json"))
+from compact import CompactWriter
+from inventory import CheckResult, Inventory
 
-final_dict = {
-    "totalProfiles": 0,
-    "locations": {
-        "totalCountries": 0,
-        "byNames": set(),
-        "byCountryCode": set()
-    },
-    "profilesByCountryCode": defaultdict(list),
-    "profilesByCountryName": defaultdict(list)
-}
+SHARDS_GLOB = "byLocations/byLocation-*.json"
+OUTPUT_PATH = "byLocations/merged.json"
+COMPACT_OUTPUT_PATH = "byLocations/merged.compact.json"
 
-for file in files:
-    with open(file, "r") as f:
-        data = json.load(f)
+# Profiles without a known latency are ranked after every measured one
+UNKNOWN_SCORE = float("inf")
 
-        final_dict["totalProfiles"] += data.get("totalProfiles", 0)
 
-        final_dict["locations"]["byNames"].update(data["locations"]["byNames"])
-        final_dict["locations"]["byCountryCode"].update(data["locations"]["byCountryCode"])
+class Spill:
+    """
+    Per-key spill files of (score, order, url) records.
 
-        for k, urls in data.get("profilesByCountryCode", {}).items():
-            final_dict["profilesByCountryCode"][k].extend(urls)
+    Shards are folded in one at a time and each key is read back on its own,
+    so memory is bounded by the largest country rather than the whole run.
+    """
 
-        for k, urls in data.get("profilesByCountryName", {}).items():
-            final_dict["profilesByCountryName"][k].extend(urls)
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.files: Dict[str, Tuple[str, TextIO]] = {}
 
-# Remove duplicates at the end
-for k in final_dict["profilesByCountryCode"]:
-    final_dict["profilesByCountryCode"][k] = list(set(final_dict["profilesByCountryCode"][k]))
+    def add(self, key: str, score: float, order: int, url: str) -> None:
+        if key not in self.files:
+            path = os.path.join(self.folder, hashlib.sha1(key.encode()).hexdigest())
+            self.files[key] = (path, open(path, "w"))
+        self.files[key][1].write(f"{score}\t{order}\t{url}\n")
 
-for k in final_dict["profilesByCountryName"]:
-    final_dict["profilesByCountryName"][k] = list(set(final_dict["profilesByCountryName"][k]))
+    def keys(self) -> List[str]:
+        return sorted(self.files)
 
-final_dict["locations"]["byNames"] = list(final_dict["locations"]["byNames"])
-final_dict["locations"]["byCountryCode"] = list(final_dict["locations"]["byCountryCode"])
-final_dict["locations"]["totalCountries"] = len(final_dict["locations"]["byCountryCode"])
+    def read(self, key: str, rank: bool) -> Iterator[Tuple[float, str]]:
+        path, fp = self.files[key]
+        fp.close()
 
-final_dict["profilesByCountryCode"] = dict(final_dict["profilesByCountryCode"])
-final_dict["profilesByCountryName"] = dict(final_dict["profilesByCountryName"])
+        with open(path) as f:
+            records = [line.rstrip("\n").split("\t", 2) for line in f]
+        os.remove(path)
 
-with open("byLocations/merged.json", "w") as f:
-    json.dump(final_dict, f, indent=2)
+        if rank:
+            records.sort(key=lambda record: (float(record[0]), int(record[1])))
+        for score, _, url in records:
+            yield float(score), url
+
+
+def score_of(scores: Dict[str, int], url: str) -> float:
+    latency = scores.get(url)
+    return latency if latency else UNKNOWN_SCORE
+
+
+def load_shard(path: str) -> Tuple[Dict, Optional[Dict]]:
+    """Reads a shard file and the checkstats file next to it, if there is one."""
+    with open(path) as fp:
+        data = json.load(fp)
+
+    stats = None
+    stats_path = path.replace("byLocation-", "checkstats-")
+    if stats_path != path and os.path.exists(stats_path):
+        with open(stats_path) as fp:
+            stats = json.load(fp)
+
+    return data, stats
+
+
+def shard_results(data: Dict, stats: Optional[Dict] = None) -> List[CheckResult]:
+    """Returns the check results of a shard, failures included when its checkstats are known."""
+    scores = data.get("scores", {})
+    names = {url: name for name, urls in data.get("profilesByCountryName", {}).items() for url in urls}
+
+    elapsed: Dict[str, int] = {}
+    failures: List[CheckResult] = []
+    for url, ok, ms in (stats or {}).get("results", []):
+        elapsed[url] = ms
+        if not ok:
+            failures.append((url, False, None, ms, None, None))
+
+    results: List[CheckResult] = [
+        (url, True, scores.get(url), elapsed.get(url), code, names.get(url))
+        for code, urls in data.get("profilesByCountryCode", {}).items() for url in urls
+    ]
+    return results + failures
+
+
+def fold_shard(data: Dict, stats: Optional[Dict], by_code: Spill, by_name: Spill, names: Dict[str, Dict[str, None]],
+               order: int, inventory: Optional[Inventory] = None) -> int:
+    """Spills the profiles of one shard, returns the next order number."""
+    if inventory is not None:
+        inventory.record_checks(shard_results(data, stats))
+
+    scores = data.get("scores", {})
+    code_of = {}
+
+    for code, urls in data.get("profilesByCountryCode", {}).items():
+        for url in urls:
+            by_code.add(code, score_of(scores, url), order, url)
+            code_of[url] = code
+            order += 1
+
+    for name, urls in data.get("profilesByCountryName", {}).items():
+        for url in urls:
+            by_name.add(name, score_of(scores, url), order, url)
+            if url in code_of:
+                names.setdefault(code_of[url], {})[name] = None
+            order += 1
+
+    return order
+
+
+def write_section(out: TextIO, spill: Spill, rank: bool, seen: Optional[set] = None,
+                  compact: Optional[CompactWriter] = None, names: Optional[Dict] = None) -> List[str]:
+    """
+    Writes one `{key: [urls]}` section in key order and returns the keys written.
+
+    With `compact`, each key is also appended to the compact file as a country.
+    """
+    written = []
+    out.write("{")
+
+    for key in spill.keys():
+        local = set()
+        urls = []
+        profiles = []
+        for score, url in spill.read(key, rank):
+            if url in local:
+                continue
+            local.add(url)
+            if seen is not None:
+                seen.add(url)
+            urls.append(url)
+            profiles.append((url, 0 if score == UNKNOWN_SCORE else int(score)))
+
+        if compact is not None:
+            compact.add_country(key, list((names or {}).get(key, {})), profiles)
+
+        if written:
+            out.write(",")
+        out.write(f"\n    {json.dumps(key)}: [")
+        out.write(",".join(f"\n      {json.dumps(url)}" for url in urls))
+        out.write("\n    ]" if urls else "]")
+        written.append(key)
+
+    out.write("\n  }" if written else "}")
+    return written
+
+
+def combine(shards: Iterable[Tuple[Dict, Optional[Dict]]], output: str, rank: bool = True,
+            compact_output: Optional[str] = None, inventory: Optional[Inventory] = None) -> int:
+    """
+    Merges the (byLocation, checkstats) shards into `output`, streaming shard
+    by shard; pass a generator of `load_shard` to read the files lazily.
+
+    Each country keeps the first occurrence of every URL, ordered by latency
+    (fastest first) when `rank` is set, otherwise in shard order. The compact
+    format is written to `compact_output` alongside when given, and the check
+    results are recorded in `inventory`.
+    Returns the number of unique profiles.
+    """
+    with tempfile.TemporaryDirectory(prefix="combine-") as folder:
+        os.makedirs(os.path.join(folder, "code"))
+        os.makedirs(os.path.join(folder, "name"))
+        by_code = Spill(os.path.join(folder, "code"))
+        by_name = Spill(os.path.join(folder, "name"))
+
+        order = 0
+        names: Dict[str, Dict[str, None]] = {}
+        for data, stats in shards:
+            order = fold_shard(data, stats, by_code, by_name, names, order, inventory)
+
+        compact = CompactWriter(compact_output) if compact_output else None
+
+        seen: set = set()
+        with open(output + ".tmp", "w") as out:
+            out.write("{\n  \"profilesByCountryCode\": ")
+            codes = write_section(out, by_code, rank, seen, compact, names)
+            out.write(",\n  \"profilesByCountryName\": ")
+            country_names = write_section(out, by_name, rank)
+
+            locations = {
+                "totalCountries": len(codes),
+                "byNames": country_names,
+                "byCountryCode": codes
+            }
+            out.write(f",\n  \"locations\": {json.dumps(locations)}")
+            out.write(f",\n  \"totalProfiles\": {len(seen)}\n}}\n")
+
+        os.replace(output + ".tmp", output)
+        if compact is not None:
+            compact.close()
+
+    return len(seen)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the byLocation files of the checker shards.")
+    parser.add_argument("files", nargs="*", help=f"Shard files (default: {SHARDS_GLOB})")
+    parser.add_argument("-o", "--output", default=OUTPUT_PATH, help="Merged file")
+    parser.add_argument("--compact", default=COMPACT_OUTPUT_PATH, help="Merged file in the compact format")
+    parser.add_argument("--inventory", metavar="PATH", help="Record the check results in this SQLite inventory")
+    parser.add_argument("--order", choices=("latency", "input"), default="latency",
+                        help="Order of the profiles of each country")
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob(SHARDS_GLOB))
+    inventory = Inventory(args.inventory) if args.inventory else None
+    total = combine((load_shard(path) for path in files), args.output, rank=args.order == "latency",
+                    compact_output=args.compact, inventory=inventory)
+    if inventory is not None:
+        inventory.close()
+
+    print(f"Merged {len(files)} shards into {total} profiles")
+
+
+if __name__ == "__main__":
+    main()
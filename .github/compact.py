@@ -0,0 +1,181 @@
+"""
+Compact, normalized byLocation format.
+
+The legacy byLocation.json stores every URL twice (by country code and by
+country name) with `indent=4`. The compact file has a single profile table,
+stored column-wise since flat arrays parse much faster than one array per row:
+
+    {
+      "version": 1,
+      "profiles": {
+        "url": ["vless://...", ...],
+        "protocol": [<index into protocols>, ...],
+        "country": [<index into countries>, ...],
+        "latency": [<ms, 0 if unknown>, ...]
+      },
+      "protocols": ["ss", "vless", ...],
+      "countries": [["DE", "Germany"], ["NL", "The Netherlands", "Netherlands"], ...],
+      "byCountry": {"DE": [start, end], ...},
+      "byProtocol": {"vless": [0, 5, ...], ...},
+      "totalProfiles": 123
+    }
+
+A country lists its code, then every name the checker reported for it.
+Profiles are grouped by country, fastest first, so a country's profiles
+are the rows `start` to `end`. `byProtocol` lists row indexes in the same
+order. The Node loader is server/functions/compact.js.
+"""
+import json
+import os
+from typing import Dict, List, Optional, TextIO, Tuple
+
+VERSION = 1
+
+COMPACT_PATH = "proxies/byLocation.compact.json"
+LEGACY_PATH = "proxies/byLocation.json"
+
+
+def scheme_of(url: str) -> str:
+    return url.split("://", 1)[0].lower()
+
+
+class CompactWriter:
+    """Writes the compact file country by country, holding only the indexes in memory."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fp: TextIO = open(path + ".tmp", "w")
+        self.fp.write('{"version": %d, "profiles": {"url": [' % VERSION)
+        self.count = 0
+        self.columns: Dict[str, List[int]] = {"protocol": [], "country": [], "latency": []}
+        self.protocols: Dict[str, int] = {}
+        self.countries: List[List[str]] = []
+        self.by_country: Dict[str, Tuple[int, int]] = {}
+        self.by_protocol: Dict[str, List[int]] = {}
+
+    def add_country(self, code: str, names: List[str], profiles: List[Tuple[str, int]]) -> None:
+        """Appends the (url, latency) profiles of one country, already ranked."""
+        country = len(self.countries)
+        self.countries.append([code, *names])
+        start = self.count
+
+        for url, latency in profiles:
+            scheme = scheme_of(url)
+            protocol = self.protocols.setdefault(scheme, len(self.protocols))
+            self.by_protocol.setdefault(scheme, []).append(self.count)
+
+            self.fp.write("," if self.count else "")
+            self.fp.write("\n" + json.dumps(url, ensure_ascii=False))
+            self.columns["protocol"].append(protocol)
+            self.columns["country"].append(country)
+            self.columns["latency"].append(latency)
+            self.count += 1
+
+        self.by_country[code] = (start, self.count)
+
+    def close(self) -> None:
+        tail = {
+            "protocols": list(self.protocols),
+            "countries": self.countries,
+            "byCountry": self.by_country,
+            "byProtocol": self.by_protocol,
+            "totalProfiles": self.count,
+        }
+        columns = json.dumps(self.columns, separators=(",", ":"))[1:]
+        self.fp.write("\n], " + columns + ", " + json.dumps(tail, separators=(",", ":"), ensure_ascii=False)[1:] + "\n")
+        self.fp.close()
+        os.replace(self.path + ".tmp", self.path)
+
+
+class Locations:
+    """Read-only view over a compact (or legacy) byLocation file."""
+
+    def __init__(self, data: Dict):
+        self.protocols: List[str] = data["protocols"]
+        self.countries: List[List[str]] = data["countries"]
+        self.url: List[str] = data["profiles"]["url"]
+        self.protocol: List[int] = data["profiles"]["protocol"]
+        self.country: List[int] = data["profiles"]["country"]
+        self.latency: List[int] = data["profiles"]["latency"]
+        self.by_country: Dict[str, List[int]] = data["byCountry"]
+        self.by_protocol: Dict[str, List[int]] = data["byProtocol"]
+
+        self.names: Dict[str, str] = {}
+        self.aliases: Dict[str, str] = {}
+        for code, *names in self.countries:
+            self.names[code] = names[0] if names else code
+            self.aliases[code.lower()] = code
+            for name in names:
+                self.aliases[name.lower()] = code
+
+    @classmethod
+    def from_legacy(cls, data: Dict) -> "Locations":
+        """Normalizes a legacy byLocation dict (no latency, every profile gets 0)."""
+        code_of = {url: code for code, urls in data.get("profilesByCountryCode", {}).items() for url in urls}
+        names: Dict[str, List[str]] = {}
+        for name, urls in data.get("profilesByCountryName", {}).items():
+            for url in urls:
+                if url in code_of:
+                    names.setdefault(code_of[url], []).append(name)
+                    break
+
+        protocols: Dict[str, int] = {}
+        profiles: Dict[str, List] = {"url": [], "protocol": [], "country": [], "latency": []}
+        compact: Dict = {"countries": [], "profiles": profiles, "byCountry": {}, "byProtocol": {}}
+        for code, urls in data.get("profilesByCountryCode", {}).items():
+            country = len(compact["countries"])
+            compact["countries"].append([code, *names.get(code, [])])
+            start = len(profiles["url"])
+            for url in dict.fromkeys(urls):
+                scheme = scheme_of(url)
+                compact["byProtocol"].setdefault(scheme, []).append(len(profiles["url"]))
+                profiles["url"].append(url)
+                profiles["protocol"].append(protocols.setdefault(scheme, len(protocols)))
+                profiles["country"].append(country)
+                profiles["latency"].append(0)
+            compact["byCountry"][code] = [start, len(profiles["url"])]
+
+        compact["protocols"] = list(protocols)
+        return cls(compact)
+
+    @property
+    def total(self) -> int:
+        return len(self.url)
+
+    def code(self, location: str) -> Optional[str]:
+        """Resolves a country code or name, case-insensitively."""
+        return self.aliases.get(location.lower())
+
+    def urls(self, location: Optional[str] = None, protocol: Optional[str] = None) -> List[str]:
+        """Returns the ranked URLs of a location and/or protocol."""
+        start, end = 0, len(self.url)
+        if location is not None:
+            code = self.code(location)
+            if code is None:
+                return []
+            start, end = self.by_country[code]
+
+        if protocol is None:
+            return self.url[start:end]
+
+        index = self.protocols.index(protocol) if protocol in self.protocols else -1
+        return [self.url[i] for i in range(start, end) if self.protocol[i] == index]
+
+    def name(self, code: str) -> str:
+        return self.names.get(code, code)
+
+
+def load(path: Optional[str] = None) -> Locations:
+    """
+    Loads the compact file, or the legacy one when `path` points to it or
+    the compact file doesn't exist yet.
+    """
+    if path is None:
+        path = COMPACT_PATH if os.path.exists(COMPACT_PATH) else LEGACY_PATH
+
+    with open(path) as fp:
+        data = json.load(fp)
+
+    if data.get("version") == VERSION:
+        return Locations(data)
+    return Locations.from_legacy(data)
@@ -0,0 +1,112 @@
+import html
+import re
+from typing import Iterator, Tuple
+
+# Share-link schemes the pipeline knows about
+SCHEMES: Tuple[str, ...] = (
+    "vless",
+    "vmess",
+    "ss",
+    "trojan",
+    "wireguard",
+    "hysteria2",
+    "hy2",
+)
+
+# Token kinds yielded by `scan`
+CONFIG = "config"
+URL = "url"
+CHANNEL = "channel"
+
+_CONFIG = r"(?:%s)://[^\s<>]+" % "|".join(sorted(SCHEMES, key=len, reverse=True))
+
+# One pass over the text finds every kind of token. Alternatives are tried in
+# order at each position, so a share link always wins over the generic URL and
+# an `@` inside a link is never mistaken for a channel mention. The leading
+# lookahead lets the engine skip positions that can't start any token. Schemes
+# are matched case-sensitively like everywhere else in the pipeline, which also
+# keeps the scan several times faster than an IGNORECASE one.
+_TOKEN_RE = re.compile(
+    r"(?=[%s@])(?:"
+    r"(?P<config>%s)"
+    r"|(?P<url>(?:https?://|www\.)[^\s<>]+)"
+    r"|(?<![\w.])(?:t\.me/|@)(?P<channel>\w+))" % ("".join(sorted({s[0] for s in SCHEMES} | {"h", "t"})), _CONFIG)
+)
+
+# Used when only share links are wanted
+_CONFIG_RE = re.compile(_CONFIG)
+
+# Only well-formed entities, so query strings like `&copy=1` are left alone
+_ENTITY_RE = re.compile(r"&(?:amp|lt|gt|quot|apos|#\d+|#x[0-9a-fA-F]+);")
+
+_TME_RE = re.compile(r"t\.me/(?:s/)?(\w+)")
+
+_TRAILING = ".,;:!?'\"]}>)…»"
+
+
+def _glued(text: str, start: int) -> bool:
+    """Tells whether a match starts in the middle of a word (e.g. the `ss://` of `xss://`)."""
+    return start > 0 and text[start - 1].isalnum()
+
+
+def clean(link: str) -> str:
+    """Decodes HTML entities and strips punctuation glued to the end of a link."""
+    if "&" in link and ";" in link:
+        # Telegram escapes every `&` of a link, a plain replace does the same in a fraction of the time
+        if link.count("&") == link.count("&amp;"):
+            link = link.replace("&amp;", "&")
+        else:
+            link = _ENTITY_RE.sub(lambda m: html.unescape(m.group(0)), link)
+
+    while link and link[-1] in _TRAILING:
+        # A closing parenthesis is part of the link when it has an opening pair
+        if link[-1] == ")" and link.count("(") >= link.count(")"):
+            break
+        link = link[:-1]
+
+    return link
+
+
+def scan(text: str) -> Iterator[Tuple[str, str]]:
+    """
+    Scans the text once and lazily yields ``(kind, value)`` tokens.
+
+    ``kind`` is one of `CONFIG`, `URL` or `CHANNEL`. A t.me URL is yielded both
+    as a URL and as the channel it points to.
+    """
+    for match in _TOKEN_RE.finditer(text):
+        kind = match.lastgroup
+        value = match.group(kind)
+
+        if kind == CONFIG and _glued(text, match.start()):
+            continue
+
+        if kind == CHANNEL:
+            yield CHANNEL, value
+            continue
+
+        value = clean(value)
+        if not value:
+            continue
+
+        yield kind, value
+
+        if kind == URL:
+            tme = _TME_RE.search(value)
+            if tme:
+                yield CHANNEL, tme.group(1)
+
+
+def iter_configs(text: str) -> Iterator[str]:
+    """Lazily yields the share links found in the text."""
+    for match in _CONFIG_RE.finditer(text):
+        if _glued(text, match.start()):
+            continue
+
+        link = match.group(0)
+        # Most links need no cleanup at all
+        if "&" in link or link[-1] in _TRAILING:
+            link = clean(link)
+        if link:
+            yield link
+
@@ -0,0 +1,33 @@
+import base64
+import hashlib
+import json
+
+
+def decode_b64(data: str) -> bytes:
+    data = data.strip()
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def normalize(config: str) -> str:
+    """
+    Returns the part of a share link that identifies the server.
+
+    The `#remark` fragment (and the `ps` field of vmess links) only carries the
+    display name, which every channel rewrites, so it is dropped.
+    """
+    config = config.strip()
+
+    if config.startswith("vmess://"):
+        try:
+            data = json.loads(decode_b64(config[len("vmess://"):]))
+            data.pop("ps", None)
+            return "vmess://" + json.dumps(data, sort_keys=True, separators=(",", ":"))
+        except (ValueError, TypeError, AttributeError):
+            pass
+
+    return config.split("#", 1)[0]
+
+
+def fingerprint(config: str) -> str:
+    """Returns a short, stable hash of the normalized config."""
+    return hashlib.blake2b(normalize(config).encode(), digest_size=8).hexdigest()
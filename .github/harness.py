@@ -0,0 +1,375 @@
+"""
+Record/replay harness for running the updater pipeline offline.
+
+    python3 .github/harness.py record --archive harness/archive
+        Runs the stages against the live sources and saves every HTTP response
+        (and the Telegram group messages) into the archive.
+
+    python3 .github/harness.py replay --archive harness/archive
+        Serves the archive from a local stand-in server and runs the stages
+        against it, reporting the time and peak memory of each stage.
+
+    python3 .github/harness.py serve --archive harness/archive --port 8765
+        Only starts the stand-in server.
+
+The stages read the mode from the environment:
+
+    PROXIES_HARNESS     "record" or "replay"
+    PROXIES_ARCHIVE     archive folder (record mode)
+    PROXIES_REPLAY_URL  base URL of the stand-in server (replay mode)
+
+The Go updater handles these in its HTTP transport, Python stages go through
+`request` and `telegram_client` below.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+MODE = os.environ.get("PROXIES_HARNESS")
+ARCHIVE = os.environ.get("PROXIES_ARCHIVE", "harness/archive")
+REPLAY_URL = os.environ.get("PROXIES_REPLAY_URL", "")
+
+URL_HEADER = "X-Harness-URL"
+
+# Archive entries for Telegram group history use this pseudo method
+TG_METHOD = "TG"
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (name, command) run in order from the work folder
+STAGES: Tuple[Tuple[str, List[str]], ...] = (
+    ("refresh_channels", [sys.executable, ".github/refresh_channels.py"]),
+    ("subscriptions", [sys.executable, ".github/subscriptions.py"]),
+    ("updater", [sys.executable, "updater/updater.py", "."]),
+    ("chunker", [sys.executable, ".github/chunker.py"]),
+)
+
+
+def archive_key(method: str, url: str) -> str:
+    """Returns the archive file name of an exchange, must match `harnessKey` in updater/main.go."""
+    return hashlib.sha1(f"{method} {url}".encode()).hexdigest()
+
+
+def save_exchange(method: str, url: str, status: int, headers: Dict[str, List[str]], body: bytes,
+                  archive: str = ARCHIVE) -> None:
+    os.makedirs(archive, exist_ok=True)
+    exchange = {
+        "method": method,
+        "url": url,
+        "status": status,
+        "headers": headers,
+        "body": base64.b64encode(body).decode(),
+    }
+    with open(os.path.join(archive, archive_key(method, url) + ".json"), "w") as fp:
+        json.dump(exchange, fp)
+
+
+def load_exchange(method: str, url: str, archive: str = ARCHIVE) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(archive, archive_key(method, url) + ".json")) as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+async def _read_body(response, max_bytes: Optional[int]) -> bytes:
+    """Reads a response body, stopping once it has more than max_bytes."""
+    body = bytearray()
+    async for chunk in response.content.iter_chunked(64 * 1024):
+        body += chunk
+        if max_bytes is not None and len(body) > max_bytes:
+            return bytes(body[:max_bytes + 1])
+    return bytes(body)
+
+
+def _refeed(response, body: bytes) -> None:
+    """Gives a response whose body was consumed a fresh stream with the same bytes."""
+    import asyncio
+    from aiohttp import StreamReader
+    from aiohttp.base_protocol import BaseProtocol
+
+    # A limit above the body size keeps the reader from pausing a protocol that has no transport
+    stream = StreamReader(BaseProtocol(asyncio.get_running_loop()), len(body) + 1, loop=asyncio.get_running_loop())
+    stream.feed_data(body)
+    stream.feed_eof()
+    response.content = stream
+
+
+@asynccontextmanager
+async def request(session, method: str, url: str, max_bytes: Optional[int] = None, **kwargs):
+    """
+    Drop-in for ``session.request(method, url, **kwargs)`` that honours the harness mode.
+
+    In replay mode redirects are followed through the stand-in server, so a
+    recorded redirect never escapes to the network. In record mode the body is
+    read (and archived) before the caller gets the response, then fed back to
+    it, so callers can read or stream it as usual. With max_bytes, no more than
+    max_bytes + 1 bytes of a body are recorded: enough for the caller to see
+    that it's too big.
+    """
+    if MODE == "replay":
+        follow = kwargs.pop("allow_redirects", method.upper() != "HEAD")
+        headers = dict(kwargs.pop("headers", None) or {})
+
+        for _ in range(10):
+            headers[URL_HEADER] = url
+            response = await session.request(method, REPLAY_URL, headers=headers,
+                                              allow_redirects=False, **kwargs)
+            location = response.headers.get("Location")
+            if not (follow and location and 300 <= response.status < 400):
+                break
+            response.release()
+            url = location
+
+        try:
+            yield response
+        finally:
+            response.release()
+        return
+
+    async with session.request(method, url, **kwargs) as response:
+        if MODE == "record":
+            body = await _read_body(response, max_bytes)
+            headers = {}
+            for key, value in response.headers.items():
+                headers.setdefault(key, []).append(value)
+            save_exchange(method.upper(), url, response.status, headers, body, ARCHIVE)
+            _refeed(response, body)
+        yield response
+
+
+def _serialize_message(message) -> Dict[str, Any]:
+    chat = getattr(message.forward, "chat", None) if message.forward else None
+    return {
+        "id": message.id,
+        "date": message.date.isoformat() if message.date else None,
+        "text": message.text,
+        "forward": {
+            "username": getattr(chat, "username", None),
+            "broadcast": getattr(chat, "broadcast", False),
+        } if chat else None,
+    }
+
+
+def _deserialize_message(data: Dict[str, Any]):
+    forward = None
+    if data.get("forward"):
+        forward = SimpleNamespace(chat=SimpleNamespace(**data["forward"]))
+    return SimpleNamespace(
+        id=data["id"],
+        date=datetime.fromisoformat(data["date"]) if data.get("date") else None,
+        text=data.get("text"),
+        forward=forward,
+    )
+
+
+class RecordingTelegramClient:
+    """Wraps a TelegramClient and saves the messages of every iterated chat."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    async def __aenter__(self):
+        await self._client.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self._client.__aexit__(*exc)
+
+    async def iter_messages(self, entity, **kwargs):
+        from telethon.utils import get_peer_id
+
+        messages = []
+        async for message in self._client.iter_messages(entity, **kwargs):
+            messages.append(_serialize_message(message))
+            yield message
+
+        body = json.dumps(messages).encode()
+        save_exchange(TG_METHOD, f"tg://{get_peer_id(entity)}", 200, {}, body)
+
+
+class ReplayTelegramClient:
+    """Serves recorded chat history with the subset of the TelegramClient API the stages use."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get_entity(self, chat):
+        return SimpleNamespace(id=chat)
+
+    async def iter_messages(self, entity, limit: Optional[int] = None, offset_date=None, min_id: int = 0,
+                            reverse: bool = False, **kwargs):
+        exchange = load_exchange(TG_METHOD, f"tg://{entity.id}")
+        if exchange is None:
+            print(f"[harness] no recorded messages for chat {entity.id}", file=sys.stderr)
+            return
+
+        # Newest first like Telegram, oldest first with reverse
+        recorded = sorted(json.loads(base64.b64decode(exchange["body"])), key=lambda data: data["id"], reverse=not reverse)
+
+        count = 0
+        for data in recorded:
+            message = _deserialize_message(data)
+            if message.id <= min_id:
+                continue
+            if offset_date and message.date and message.date.replace(tzinfo=None) >= offset_date.replace(tzinfo=None):
+                continue
+            if limit is not None and count >= limit:
+                break
+            count += 1
+            yield message
+
+
+def telegram_client(session: str, api_id: int, api_hash: str):
+    """Returns the Telegram client to use for the current harness mode."""
+    if MODE == "replay":
+        return ReplayTelegramClient()
+
+    from telethon import TelegramClient
+    from telethon.sessions import StringSession
+
+    client = TelegramClient(StringSession(session), api_id, api_hash)
+    return RecordingTelegramClient(client) if MODE == "record" else client
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    archive: str = ARCHIVE
+    hits = 0
+    misses = 0
+
+    def _replay(self) -> None:
+        url = self.headers.get(URL_HEADER) or self.path
+        exchange = load_exchange(self.command, url, self.archive)
+
+        # A HEAD that was never recorded can be answered from the recorded GET
+        if exchange is None and self.command == "HEAD":
+            exchange = load_exchange("GET", url, self.archive)
+
+        if exchange is None:
+            type(self).misses += 1
+            self.send_error(404, f"Not recorded: {self.command} {url}")
+            return
+
+        type(self).hits += 1
+        body = base64.b64decode(exchange["body"])
+        self.send_response(exchange["status"])
+        for key, values in exchange["headers"].items():
+            if key.lower() in ("content-length", "content-encoding", "transfer-encoding", "connection"):
+                continue
+            for value in values:
+                self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    do_GET = do_POST = do_HEAD = _replay
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(archive: str, port: int = 0) -> ThreadingHTTPServer:
+    """Starts the stand-in server in a background thread."""
+    handler = type("Handler", (ReplayHandler,), {"archive": archive})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_stage(name: str, command: List[str], cwd: str, env: Dict[str, str]) -> Tuple[int, float, float]:
+    """Runs one stage and returns its exit code, wall time and peak RSS in MB."""
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=cwd, env=env)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux
+    return os.waitstatus_to_exitcode(status), elapsed, usage.ru_maxrss / 1024
+
+
+def prepare_workdir(workdir: Optional[str]) -> str:
+    """Copies the repository into a scratch folder so runs don't touch the checkout."""
+    if workdir:
+        return os.path.abspath(workdir)
+
+    workdir = tempfile.mkdtemp(prefix="proxies-harness-")
+    shutil.copytree(ROOT_DIR, workdir, dirs_exist_ok=True,
+                    ignore=shutil.ignore_patterns(".git", "node_modules", "harness"))
+    return workdir
+
+
+def run_stages(mode: str, archive: str, workdir: Optional[str], stages: List[str], replay_url: str = "") -> None:
+    cwd = prepare_workdir(workdir)
+    env = dict(os.environ,
+               PROXIES_HARNESS=mode,
+               PROXIES_ARCHIVE=archive,
+               PROXIES_REPLAY_URL=replay_url,
+               PYTHONUNBUFFERED="1")
+
+    results = []
+    for name, command in STAGES:
+        if stages and name not in stages:
+            continue
+        print(f"[harness] running {name} ({mode}) in {cwd}", file=sys.stderr)
+        results.append((name, *run_stage(name, command, cwd, env)))
+
+    print(f"\n{'stage':<20}{'exit':>6}{'time (s)':>12}{'peak RSS (MB)':>16}")
+    for name, code, elapsed, peak in results:
+        print(f"{name:<20}{code:>6}{elapsed:>12.2f}{peak:>16.1f}")
+    print(f"{'total':<20}{'':>6}{sum(r[2] for r in results):>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record/replay harness for the updater pipeline.")
+    parser.add_argument("command", choices=("record", "replay", "serve"))
+    parser.add_argument("--archive", default="harness/archive", help="Archive folder")
+    parser.add_argument("--workdir", help="Run the stages here instead of in a scratch copy")
+    parser.add_argument("--stage", action="append", default=[], help="Only run these stages")
+    parser.add_argument("--port", type=int, default=0, help="Port of the stand-in server")
+    args = parser.parse_args()
+
+    archive = os.path.abspath(args.archive)
+
+    if args.command == "record":
+        run_stages("record", archive, args.workdir, args.stage)
+        return
+
+    server = start_server(archive, args.port)
+    replay_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    if args.command == "serve":
+        print(f"[harness] serving {archive} on {replay_url}", file=sys.stderr)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    run_stages("replay", archive, args.workdir, args.stage, replay_url)
+    handler = server.RequestHandlerClass
+    print(f"\nreplayed {handler.hits} responses, {handler.misses} not recorded")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
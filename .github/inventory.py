@@ -0,0 +1,342 @@
+"""
+SQLite inventory of every config, where it came from and how its checks went.
+
+The updater records configs and their sources, the checker (or combine.py,
+from the shard outputs) records check results. The txt and byLocation
+outputs can be regenerated from it:
+
+    python3 .github/inventory.py export-txt
+    python3 .github/inventory.py export-json
+    python3 .github/inventory.py query --country DE --since 24 --protocol vless
+    python3 .github/inventory.py stats
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from compact import CompactWriter, scheme_of
+from fingerprint import fingerprint
+
+INVENTORY_PATH = "data/inventory.sqlite3"
+
+# Check results older than this are dropped
+HISTORY_MAX_AGE = 3 * 24 * 60 * 60
+
+# Configs neither seen in a source nor checked for this long are dropped
+CONFIG_MAX_AGE = 7 * 24 * 60 * 60
+
+# Checks within this window of the newest one belong to the same run
+RUN_WINDOW = 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS configs (
+    fingerprint TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    protocol TEXT NOT NULL,
+    first_seen INTEGER NOT NULL,
+    last_seen INTEGER NOT NULL,
+    -- Output file and position the updater last wrote the config to
+    path TEXT,
+    position INTEGER,
+    -- Outcome of the latest check
+    country TEXT,
+    country_name TEXT,
+    last_checked INTEGER,
+    last_ok INTEGER,
+    last_success INTEGER,
+    latency INTEGER
+);
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS config_sources (
+    fingerprint TEXT NOT NULL,
+    source_id INTEGER NOT NULL,
+    last_seen INTEGER NOT NULL,
+    PRIMARY KEY (fingerprint, source_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS checks (
+    fingerprint TEXT NOT NULL,
+    checked_at INTEGER NOT NULL,
+    ok INTEGER NOT NULL,
+    latency INTEGER,
+    elapsed INTEGER,
+    country TEXT
+);
+-- Every file the updater wrote in a run, with the content of those that don't hold configs
+CREATE TABLE IF NOT EXISTS outputs (
+    path TEXT PRIMARY KEY,
+    written_at INTEGER NOT NULL,
+    content TEXT
+);
+CREATE INDEX IF NOT EXISTS checks_by_config ON checks (fingerprint, checked_at);
+CREATE INDEX IF NOT EXISTS checks_by_time ON checks (checked_at);
+CREATE INDEX IF NOT EXISTS configs_by_country ON configs (country, last_ok, latency);
+CREATE INDEX IF NOT EXISTS configs_by_protocol ON configs (protocol, last_ok, latency);
+CREATE INDEX IF NOT EXISTS configs_by_path ON configs (path, position);
+"""
+
+# (url, ok, latency ms, elapsed ms, country code, country name)
+CheckResult = Tuple[str, bool, int, int, Optional[str], Optional[str]]
+
+
+class Inventory:
+    def __init__(self, path: str = INVENTORY_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.now = int(time.time())
+
+    def __enter__(self) -> "Inventory":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.db.commit()
+        self.db.close()
+
+    def source_id(self, name: str) -> int:
+        self.db.execute("INSERT OR IGNORE INTO sources (name) VALUES (?)", (name,))
+        return self.db.execute("SELECT id FROM sources WHERE name = ?", (name,)).fetchone()[0]
+
+    def _upsert_configs(self, rows: Iterable[Tuple[str, str, str]]) -> None:
+        """Inserts (fingerprint, url, protocol) rows or refreshes their last seen time."""
+        self.db.executemany("""
+            INSERT INTO configs (fingerprint, url, protocol, first_seen, last_seen)
+            VALUES (?1, ?2, ?3, ?4, ?4)
+            ON CONFLICT (fingerprint) DO UPDATE SET last_seen = excluded.last_seen
+        """, ((key, url, protocol, self.now) for key, url, protocol in rows))
+
+    def add_configs(self, configs: Iterable[str], source: str) -> None:
+        """Records the configs a source yielded in this run."""
+        rows = {}
+        for config in configs:
+            config = config.strip()
+            if config:
+                rows[fingerprint(config)] = (config, scheme_of(config))
+
+        self._upsert_configs((key, url, protocol) for key, (url, protocol) in rows.items())
+
+        sid = self.source_id(source)
+        self.db.executemany("""
+            INSERT INTO config_sources (fingerprint, source_id, last_seen) VALUES (?, ?, ?)
+            ON CONFLICT (fingerprint, source_id) DO UPDATE SET last_seen = excluded.last_seen
+        """, ((key, sid, self.now) for key in rows))
+
+    def set_output(self, path: str, configs: List[str]) -> None:
+        """Records the file the updater wrote the configs to, in order, with the exact URLs written."""
+        path = self.drop_output(path)
+        self.db.executemany("UPDATE configs SET path = ?, position = ?, url = ? WHERE fingerprint = ?",
+                            ((path, i, config, fingerprint(config)) for i, config in enumerate(configs)))
+        self.db.execute("INSERT INTO outputs (path, written_at) VALUES (?, ?)", (path, self.now))
+
+    def set_plain_output(self, path: str, lines: List[str]) -> None:
+        """Records a file of lines that aren't configs, like the regular proxy lists, as written."""
+        path = self.drop_output(path)
+        self.db.execute("INSERT INTO outputs (path, written_at, content) VALUES (?, ?, ?)",
+                        (path, self.now, "\n".join(lines)))
+
+    def drop_output(self, path: str) -> str:
+        """Forgets what was written to a file, returns its normalized path."""
+        path = os.path.normpath(path)
+        self.db.execute("UPDATE configs SET path = NULL, position = NULL WHERE path = ?", (path,))
+        self.db.execute("DELETE FROM outputs WHERE path = ?", (path,))
+        return path
+
+    def record_checks(self, results: Iterable[CheckResult], checked_at: Optional[int] = None) -> int:
+        """Records check results and updates the latest outcome of each config."""
+        checked_at = checked_at or self.now
+        # A latency of 0 means it wasn't measured
+        results = [(fingerprint(url), url, ok, latency or None, elapsed, code, name)
+                   for url, ok, latency, elapsed, code, name in results]
+
+        self._upsert_configs((key, url, scheme_of(url)) for key, url, *_ in results)
+        self.db.executemany("""
+            INSERT INTO checks (fingerprint, checked_at, ok, latency, elapsed, country)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, ((key, checked_at, int(ok), latency, elapsed, code) for key, _, ok, latency, elapsed, code, _ in results))
+        self.db.executemany("""
+            UPDATE configs SET
+                last_checked = ?1, last_ok = ?2,
+                last_success = CASE WHEN ?2 THEN ?1 ELSE last_success END,
+                latency = CASE WHEN ?2 THEN ?3 ELSE latency END,
+                country = COALESCE(?4, country),
+                country_name = COALESCE(?5, country_name)
+            WHERE fingerprint = ?6
+        """, ((checked_at, int(ok), latency, code, name, key) for key, _, ok, latency, _, code, name in results))
+        return len(results)
+
+    def prune(self) -> Tuple[int, int]:
+        """Drops old check results and configs gone from every source. Returns both counts."""
+        checks = self.db.execute("DELETE FROM checks WHERE checked_at < ?",
+                                 (self.now - HISTORY_MAX_AGE,)).rowcount
+        cutoff = self.now - CONFIG_MAX_AGE
+        configs = self.db.execute("""
+            DELETE FROM configs WHERE last_seen < ?1 AND COALESCE(last_checked, 0) < ?1
+        """, (cutoff,)).rowcount
+        self.db.execute("DELETE FROM config_sources WHERE last_seen < ?", (cutoff,))
+        self.db.execute("DELETE FROM sources WHERE id NOT IN (SELECT DISTINCT source_id FROM config_sources)")
+        self.db.execute("DELETE FROM outputs WHERE written_at < ?", (cutoff,))
+        return checks, configs
+
+    def alive(self, country: Optional[str] = None, protocol: Optional[str] = None,
+              since: int = 24 * 60 * 60, limit: int = -1) -> List[Tuple[str, int, str]]:
+        """
+        Returns (url, latency, country) of the configs that passed every check
+        in the last `since` seconds, fastest first.
+        """
+        return self.db.execute("""
+            SELECT c.url, c.latency, c.country FROM configs c
+            JOIN checks k ON k.fingerprint = c.fingerprint AND k.checked_at >= ?1
+            WHERE (?2 IS NULL OR c.country = ?2) AND (?3 IS NULL OR c.protocol = ?3)
+            GROUP BY c.fingerprint
+            HAVING MIN(k.ok) = 1
+            ORDER BY c.latency IS NULL, c.latency
+            LIMIT ?4
+        """, (self.now - since, country and country.upper(), protocol, limit)).fetchall()
+
+    def latest_working(self) -> List[Tuple[str, str, str, int]]:
+        """Returns (country, country name, url, latency) of the configs that passed the latest run."""
+        latest = self.db.execute("SELECT MAX(last_checked) FROM configs").fetchone()[0] or 0
+        return self.db.execute("""
+            SELECT country, country_name, url, latency FROM configs
+            WHERE last_ok = 1 AND last_checked >= ? AND country IS NOT NULL
+            ORDER BY country, latency IS NULL, latency
+        """, (latest - RUN_WINDOW,)).fetchall()
+
+    def history(self) -> Dict[str, Tuple[int, Optional[int], Optional[int], int, int, Optional[str]]]:
+        """
+        Returns (first seen, last checked, last ok, checks, successes, country)
+        of every config by fingerprint, counting the checks still kept.
+        """
+        return {row[0]: row[1:] for row in self.db.execute("""
+            SELECT c.fingerprint, c.first_seen, c.last_checked, c.last_ok,
+                   COUNT(k.ok), COALESCE(SUM(k.ok), 0), c.country
+            FROM configs c LEFT JOIN checks k ON k.fingerprint = c.fingerprint
+            GROUP BY c.fingerprint
+        """)}
+
+    def last_passed(self) -> Dict[str, Tuple[str, str, Optional[int]]]:
+        """Returns (country, country name, latency) by fingerprint of the configs whose latest check passed."""
+        return {row[0]: row[1:] for row in self.db.execute("""
+            SELECT fingerprint, country, COALESCE(country_name, country), latency FROM configs
+            WHERE last_ok = 1 AND country IS NOT NULL
+        """)}
+
+    def outputs(self) -> Dict[str, List[str]]:
+        """Returns the lines of every file the updater wrote in its latest run."""
+        latest = self.db.execute("SELECT MAX(written_at) FROM outputs").fetchone()[0] or 0
+        files: Dict[str, List[str]] = {}
+        for path, content in self.db.execute("""
+            SELECT path, content FROM outputs WHERE written_at >= ? ORDER BY path
+        """, (latest - RUN_WINDOW,)):
+            files[path] = content.split("\n") if content else []
+
+        for path, url in self.db.execute("""
+            SELECT c.path, c.url FROM configs c JOIN outputs o ON o.path = c.path
+            WHERE o.content IS NULL AND o.written_at >= ?
+            ORDER BY c.path, c.position
+        """, (latest - RUN_WINDOW,)):
+            files[path].append(url)
+        return files
+
+    def stats(self) -> Dict[str, int]:
+        one = lambda query, *args: self.db.execute(query, args).fetchone()[0]
+        return {
+            "configs": one("SELECT COUNT(*) FROM configs"),
+            "sources": one("SELECT COUNT(*) FROM sources"),
+            "checks": one("SELECT COUNT(*) FROM checks"),
+            "working": one("SELECT COUNT(*) FROM configs WHERE last_ok = 1"),
+            "countries": one("SELECT COUNT(DISTINCT country) FROM configs WHERE last_ok = 1"),
+        }
+
+
+def export_txt(inventory: Inventory, root: str = ".") -> int:
+    files = inventory.outputs()
+    for path, lines in files.items():
+        path = os.path.join(root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w") as fp:
+            fp.write("\n".join(lines))
+        os.replace(path + ".tmp", path)
+    return len(files)
+
+
+def export_json(inventory: Inventory, legacy_path: str, compact_path: Optional[str] = None) -> int:
+    by_code: Dict[str, List[Tuple[str, int]]] = {}
+    names: Dict[str, str] = {}
+    for code, name, url, latency in inventory.latest_working():
+        by_code.setdefault(code, []).append((url, latency or 0))
+        names.setdefault(code, name or code)
+
+    by_name: Dict[str, List[str]] = {}
+    for code, profiles in by_code.items():
+        by_name.setdefault(names[code], []).extend(url for url, _ in profiles)
+
+    data = {
+        "totalProfiles": sum(len(profiles) for profiles in by_code.values()),
+        "locations": {
+            "totalCountries": len(by_code),
+            "byNames": list(by_name),
+            "byCountryCode": list(by_code)
+        },
+        "profilesByCountryCode": {code: [url for url, _ in profiles] for code, profiles in by_code.items()},
+        "profilesByCountryName": by_name
+    }
+    with open(legacy_path, "w") as fp:
+        json.dump(data, fp, indent=4)
+
+    if compact_path:
+        writer = CompactWriter(compact_path)
+        for code, profiles in by_code.items():
+            writer.add_country(code, [names[code]], profiles)
+        writer.close()
+
+    return data["totalProfiles"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query and export the config inventory.")
+    parser.add_argument("--db", default=INVENTORY_PATH, help="Inventory database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    txt = commands.add_parser("export-txt", help="Regenerate the proxies/**/*.txt files")
+    txt.add_argument("--root", default=".", help="Folder the proxies/ paths are relative to")
+
+    js = commands.add_parser("export-json", help="Regenerate byLocation.json from the latest checks")
+    js.add_argument("--output", default="proxies/byLocation.json", help="Legacy byLocation file")
+    js.add_argument("--compact", default="proxies/byLocation.compact.json", help="Compact byLocation file")
+
+    query = commands.add_parser("query", help="List configs that passed every recent check, fastest first")
+    query.add_argument("--country", help="Country code")
+    query.add_argument("--protocol", help="Protocol, e.g. vless")
+    query.add_argument("--since", type=float, default=24, help="Window in hours")
+    query.add_argument("--limit", type=int, default=-1)
+
+    commands.add_parser("stats", help="Print table sizes")
+    args = parser.parse_args()
+
+    with Inventory(args.db) as inventory:
+        if args.command == "export-txt":
+            print(f"Exported {export_txt(inventory, args.root)} files")
+        elif args.command == "export-json":
+            print(f"Exported {export_json(inventory, args.output, args.compact)} profiles")
+        elif args.command == "query":
+            for url, latency, country in inventory.alive(args.country, args.protocol, int(args.since * 3600), args.limit):
+                print(f"{country}\t{latency}\t{url}")
+        else:
+            for key, value in inventory.stats().items():
+                print(f"{key:<12}{value}")
+
+
+if __name__ == "__main__":
+    main()
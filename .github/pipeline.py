@@ -0,0 +1,190 @@
+"""
+Runs the whole pipeline on one machine, from the sources to byLocation.json:
+
+    python3 .github/pipeline.py [--workers 8] [--shards 8] [--skip-update]
+                                [--inventory data/inventory.sqlite3] [--publish]
+
+    update    subscriptions.py and updater.py (plus refresh_channels.py with
+              --refresh-channels), as separate processes like in the workflow
+    chunk     loads the unique configs once and packs them into shards of
+              about equal estimated cost (chunker.py)
+    check     checks the shards in parallel worker processes (checker.py)
+    combine   merges the shard results into proxies/byLocation.json and the
+              compact file (combine.py), records the chunker history
+    publish   publish.py, with --publish
+
+Unlike the workflow, the configs, shard results and check stats are handed
+from stage to stage in memory instead of through artifacts. Run it from the
+repository root; the time of every stage is printed at the end.
+"""
+import argparse
+import importlib.util
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from glob import iglob
+from typing import Any, Dict, List, Optional, Tuple
+
+import chunker
+import combine
+from compact import COMPACT_PATH, LEGACY_PATH
+from fingerprint import fingerprint
+from harness import STAGES, run_stage
+from inventory import Inventory
+import publish
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHECKER_PATH = os.path.join(ROOT_DIR, "checker", "checker.py")
+
+UPDATE_STAGES = ("refresh_channels", "subscriptions", "updater")
+
+# Folders the checker reads its configs from, like its folder_paths
+INPUT_DIRS = ("proxies/v2ray", "proxies/tvc")
+
+# The checker module of this process, loaded once per worker. Only workers
+# load it: the Go runtime in proxies.so doesn't survive a fork, so the pool
+# spawns fresh interpreters instead.
+_checker: Any = None
+
+
+def load_checker(workdir: str) -> Any:
+    """
+    Imports checker.py as a module and configures it with a workflow
+    directory of its own for the xray JSON files.
+    """
+    global _checker
+    if _checker is None:
+        os.makedirs(os.path.join(workdir, "json_files"), exist_ok=True)
+        spec = importlib.util.spec_from_file_location("checker", CHECKER_PATH)
+        module = importlib.util.module_from_spec(spec)  # type: ignore
+        spec.loader.exec_module(module)  # type: ignore
+        module.configure(workdir)
+        _checker = module
+    return _checker
+
+
+def init_worker(workdir: str) -> None:
+    load_checker(tempfile.mkdtemp(prefix="worker-", dir=workdir))
+
+
+def check_shard(index: int, configs: List[str]) -> Tuple[int, Dict, Dict]:
+    """Checks one shard in a worker process, returns its byLocation and checkstats dicts."""
+    checker = _checker
+    start = time.perf_counter()
+
+    outputs, failures = [], []
+    for chunk in checker.chunks(configs, checker.CHUNK_SIZE):
+        chunk_outputs, chunk_failures = checker.check_lines(list(chunk))
+        outputs += chunk_outputs
+        failures += chunk_failures
+
+    stats = checker.check_stats(outputs, failures, time.perf_counter() - start)
+    return index, checker.build_by_location(outputs), stats
+
+
+def run_update(refresh_channels: bool) -> None:
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    for name, command in STAGES:
+        if name not in UPDATE_STAGES or (name == "refresh_channels" and not refresh_channels):
+            continue
+        code, elapsed, peak = run_stage(name, command, ROOT_DIR, env)
+        print(f"[pipeline] {name}: exit {code} in {elapsed:.1f}s, peak RSS {peak:.0f} MB", file=sys.stderr)
+        if code != 0:
+            raise SystemExit(f"{name} failed with exit code {code}")
+
+
+def load_configs() -> List[str]:
+    """Reads the unique configs in file order, the same way checker.py does."""
+    configs: Dict[str, str] = {}
+    for folder in INPUT_DIRS:
+        for path in sorted(iglob(os.path.join(folder, "*.txt"))):
+            with open(path) as fp:
+                for line in fp:
+                    line = line.strip()
+                    if line:
+                        configs.setdefault(fingerprint(line), line)
+    return list(configs.values())
+
+
+def run_chunk(shards: int, history_path: str) -> List[List[str]]:
+    configs = load_configs()
+    chunks, loads = chunker.pack_by_cost(configs, shards, chunker.cost_model(chunker.load_history(history_path)))
+    print(f"[pipeline] packed {len(configs)} configs into {shards} shards, "
+          f"predicted imbalance {chunker.imbalance(loads):.2f}", file=sys.stderr)
+    return chunks
+
+
+def run_check(workdir: str, chunks: List[List[str]], workers: int) -> List[Tuple[Dict, Dict]]:
+    results: List[Optional[Tuple[Dict, Dict]]] = [None] * len(chunks)
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=init_worker, initargs=(workdir,)) as executor:
+        futures = [executor.submit(check_shard, i, chunk) for i, chunk in enumerate(chunks) if chunk]
+        for future in as_completed(futures):
+            index, data, stats = future.result()
+            results[index] = (data, stats)
+            print(f"[pipeline] shard {index + 1}/{len(chunks)}: {data['totalProfiles']} of "
+                  f"{len(stats['results'])} working in {stats['elapsed']:.1f}s", file=sys.stderr)
+
+    return [result for result in results if result is not None]
+
+
+def run_combine(shards: List[Tuple[Dict, Dict]], inventory_path: Optional[str], history_path: str) -> int:
+    inventory = Inventory(inventory_path) if inventory_path else None
+    try:
+        total = combine.combine(shards, LEGACY_PATH, compact_output=COMPACT_PATH, inventory=inventory)
+    finally:
+        if inventory is not None:
+            inventory.close()
+
+    chunker.record_stats([stats for _, stats in shards], history_path)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the updater, checker and combine stages locally.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Checker worker processes")
+    parser.add_argument("--shards", type=int, help="Number of shards (default: one per worker)")
+    parser.add_argument("--skip-update", action="store_true", help="Check the configs already in proxies/")
+    parser.add_argument("--refresh-channels", action="store_true", help="Also refresh the Telegram channel list")
+    parser.add_argument("--history", default=chunker.HISTORY_PATH, help="Chunker check history file")
+    parser.add_argument("--inventory", metavar="PATH", help="Record the configs and checks in this SQLite inventory")
+    parser.add_argument("--publish", action="store_true", help="Also publish the per-location subscription files")
+    args = parser.parse_args()
+
+    os.chdir(ROOT_DIR)
+    workdir = tempfile.mkdtemp(prefix="proxies-pipeline-")
+    timings: List[Tuple[str, float]] = []
+
+    def timed(name: str, stage, *stage_args):
+        start = time.perf_counter()
+        result = stage(*stage_args)
+        timings.append((name, time.perf_counter() - start))
+        return result
+
+    try:
+        if not args.skip_update:
+            timed("update", run_update, args.refresh_channels)
+
+        chunks = timed("chunk", run_chunk, args.shards or args.workers, args.history)
+        shards = timed("check", run_check, workdir, chunks, args.workers)
+        total = timed("combine", run_combine, shards, args.inventory, args.history)
+        print(f"[pipeline] {total} working profiles in {LEGACY_PATH}", file=sys.stderr)
+
+        if args.publish:
+            timed("publish", publish.publish)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n{'stage':<12}{'time (s)':>12}")
+    for name, elapsed in timings:
+        print(f"{name:<12}{elapsed:>12.2f}")
+    print(f"{'total':<12}{sum(elapsed for _, elapsed in timings):>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
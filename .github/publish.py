@@ -0,0 +1,125 @@
+"""
+Publishes ready-to-serve subscription files for every location.
+
+Reads the merged byLocation (compact or legacy) and writes, for each country, protocol and
+standard size, the exact body the `/proxies/v2ray/location/:location` route
+would build, in plain and base64 form:
+
+    proxies/published/locations/<code>/<protocol>-<size>.txt
+    proxies/published/locations/<code>/<protocol>-<size>.b64
+
+`manifest.json` next to them maps every alias (country code or name) to its
+files, with their sizes and sha256 hashes, so the server only has to look a
+request up and stream the file.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+import compact
+
+OUTPUT_DIR = "proxies/published"
+
+# Amounts subscribers commonly ask for, plus "all"
+SIZES = (10, 20, 50, 100, 200)
+
+
+def build_bodies(urls: List[str]) -> Dict[str, str]:
+    """Returns the plain body of every (protocol, size) variant, keyed "<protocol>-<size>"."""
+    groups = {"all": urls}
+    for url in urls:
+        groups.setdefault(compact.scheme_of(url), []).append(url)
+
+    bodies = {}
+    for protocol, configs in groups.items():
+        bodies[f"{protocol}-all"] = "\n\n".join(configs)
+        for size in SIZES:
+            # Larger sizes are served from the "all" variant
+            if size < len(configs):
+                bodies[f"{protocol}-{size}"] = "\n\n".join(configs[:size])
+    return bodies
+
+
+def write_if_changed(path: str, data: bytes) -> bool:
+    try:
+        with open(path, "rb") as fp:
+            if fp.read() == data:
+                return False
+    except OSError:
+        pass
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as fp:
+        fp.write(data)
+    os.replace(path + ".tmp", path)
+    return True
+
+
+def publish(by_location_path: Optional[str] = None, output_dir: str = OUTPUT_DIR) -> Dict:
+    locations = compact.load(by_location_path)
+
+    aliases = {alias: code.lower() for alias, code in locations.aliases.items()}
+
+    manifest = {"sizes": list(SIZES), "aliases": aliases, "locations": {}}
+    expected = {os.path.join(output_dir, "manifest.json")}
+    written = 0
+
+    for code in locations.by_country:
+        urls = locations.urls(code)
+        code = code.lower()
+        variants = {}
+
+        for key, body in build_bodies(urls).items():
+            plain = body.encode()
+            files = {}
+            for encoding, content in (("plain", plain), ("base64", base64.b64encode(plain))):
+                relpath = f"locations/{code}/{key}.{'txt' if encoding == 'plain' else 'b64'}"
+                path = os.path.join(output_dir, relpath)
+                expected.add(path)
+                written += write_if_changed(path, content)
+                files[encoding] = {
+                    "path": relpath,
+                    "bytes": len(content),
+                    "sha256": hashlib.sha256(content).hexdigest(),
+                }
+            variants[key] = files
+
+        counts = {}
+        for url in urls:
+            counts[compact.scheme_of(url)] = counts.get(compact.scheme_of(url), 0) + 1
+        manifest["locations"][code] = {"total": len(urls), "protocols": counts, "variants": variants}
+
+    # Drop the files of locations and variants that are gone
+    removed = 0
+    for folder, _, files in os.walk(output_dir, topdown=False):
+        for name in files:
+            path = os.path.join(folder, name)
+            if path not in expected:
+                os.remove(path)
+                removed += 1
+        if folder != output_dir and not os.listdir(folder):
+            os.rmdir(folder)
+
+    write_if_changed(os.path.join(output_dir, "manifest.json"),
+                     json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+    print(f"Published {len(expected) - 1} files for {len(manifest['locations'])} locations "
+          f"({written} changed, {removed} removed)")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish static subscription files per location.")
+    parser.add_argument("--input", help=f"Merged byLocation file (default: {compact.COMPACT_PATH}, "
+                                        f"or {compact.LEGACY_PATH} if it doesn't exist)")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="Output folder")
+    args = parser.parse_args()
+
+    publish(args.input, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,16 @@
 import json
-from telethon import TelegramClient
-from datetime import datetime, timedelta
+import re
+from contextlib import contextmanager
+from datetime import datetime
 import aiohttp
 import asyncio
-import re
-from os import environ
-from telethon.sessions import StringSession
+from os import environ, makedirs, path, replace
+from time import perf_counter, time
 
-API_ID = int(environ.get("API_ID"))
+import harness
+from extractor import CHANNEL, CONFIG, URL, scan
+
+API_ID = int(environ.get("API_ID", 0))
 API_HASH = environ.get("API_HASH")
 SESSION = environ.get("SESSION")
 
@@ -18,80 +21,290 @@ CHATS = [
     -1001878264271
 ]
 
+# Verification results are cached here between runs
+CHANNEL_CACHE = "data/channel_cache.json"
 
-async def main():
+# How long a verified / rejected channel is trusted before it's checked again
+POSITIVE_TTL = 12 * 60 * 60
+NEGATIVE_TTL = 3 * 24 * 60 * 60
+
+# At most this many channels are checked against t.me at once
+MAX_CONCURRENCY = 20
+
+# Per-group checkpoints and everything extracted from the groups so far
+GROUP_STORE = "data/group_store.json"
+
+# Extracted items not seen again for this long are dropped from the store
+STORE_MAX_AGE = 2 * 24 * 60 * 60
+
+# Upper bound of messages read from a group in one run
+MESSAGE_LIMIT = 3000
+
+# Messages naming a protocol are config posts, their mentions and forwards lead to channels
+PROTOCOL_HINT = re.compile(r"\b(?:vless|vmess|ss|trojan|hystria|hysteria2?|hy2|wg|wireguard)\b", re.IGNORECASE)
+
+
+@contextmanager
+def phase(name, timings):
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = perf_counter() - start
+
+
+class GroupStore:
+    """
+    Persists the highest processed message id of every group, plus the configs,
+    sub urls and channels extracted so far, so each run only has to scan the delta.
+    """
+
+    KINDS = ("configs", "urls", "channels")
+
+    def __init__(self, store_path=GROUP_STORE):
+        self.store_path = store_path
+        self.now = int(time())
+
+        try:
+            with open(store_path) as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            data = {}
+
+        self.checkpoints = data.get("checkpoints", {})
+        self.items = {kind: data.get(kind, {}) for kind in self.KINDS}
+
+    def min_id(self, chat):
+        return self.checkpoints.get(str(chat), 0)
+
+    def advance(self, chat, message_id):
+        if message_id > self.min_id(chat):
+            self.checkpoints[str(chat)] = message_id
+
+    def merge(self, kind, values):
+        """Adds values to the store, refreshing their last-seen time."""
+        items = self.items[kind]
+        for value in values:
+            items[value] = self.now
+
+    def values(self, kind):
+        """Returns the stored values of a kind, most recently seen first."""
+        items = self.items[kind]
+        return sorted(items, key=items.get, reverse=True)
+
+    def save(self):
+        """Ages out old items and writes the store back."""
+        cutoff = self.now - STORE_MAX_AGE
+        data = {"checkpoints": self.checkpoints}
+        for kind, items in self.items.items():
+            data[kind] = {value: seen for value, seen in items.items() if seen >= cutoff}
+
+        makedirs(path.dirname(self.store_path), exist_ok=True)
+        with open(self.store_path + ".tmp", "w") as fp:
+            json.dump(data, fp, separators=(",", ":"))
+        replace(self.store_path + ".tmp", self.store_path)
+
+
+async def collect_chat(client, chat, min_id):
+    """Collects configs, sub urls and channel names from the messages of one group newer than min_id."""
     configs = []
     sub_urls = []
-    async with TelegramClient(StringSession(SESSION), API_ID, API_HASH) as client:
-        scraped = await load_previous_channels()
-        for chat in CHATS:
-            print('getting messages from group', chat) 
-            group = await client.get_entity(chat)
-            offset_date_filter = datetime.now() - timedelta(days=1)
+    channels = set()
+    max_id = min_id
+    scanned = 0
 
-            async for message in client.iter_messages(group, limit=3000, offset_date=offset_date_filter):
-                if not message.text:
-                    continue
+    print('getting messages from group', chat, 'after message', min_id)
+    group = await client.get_entity(chat)
 
-                if re.search(r'https?://\S+|www\.\S+', message.text):
-                    url = re.findall(r'https?://\S+|www\.\S+', message.text)
-                    sub_urls.extend(url)
+    # From a checkpoint, read oldest first so the checkpoint only covers what was
+    # processed and a backlog longer than MESSAGE_LIMIT is picked up next run.
+    # Without one, only the newest messages are worth reading.
+    if min_id:
+        messages = client.iter_messages(group, limit=MESSAGE_LIMIT, min_id=min_id, reverse=True)
+    else:
+        messages = client.iter_messages(group, limit=MESSAGE_LIMIT)
 
-                if not re.search(r'\b(vless|vmess|ss|trojan|hystria|wg)\b', message.text, re.IGNORECASE):
-                    continue
+    async for message in messages:
+        max_id = max(max_id, message.id)
+        scanned += 1
 
-                configs.extend(re.findall(r"(?:vless|vmess|ss|trojan)://[^\s#]+(?:#[^\s]*)?", message.text))
+        if not message.text:
+            continue
 
-                if message.forward and hasattr(message.forward, 'chat') and hasattr(message.forward.chat, 'username') and message.forward.chat.broadcast:
-                    scraped.add(message.forward.chat.username)
-                if message.text:
-                    matches = re.findall(r'(?:t\.me/|@)(\w+)', message.text)
-                    for match in matches:
-                        scraped.add(match)
+        # One pass over the message finds links, sub urls and mentions
+        found_config = False
+        mentions = []
+        for kind, value in scan(message.text):
+            if kind == CONFIG:
+                configs.append(value)
+                found_config = True
+            elif kind == URL:
+                sub_urls.append(value)
+            elif kind == CHANNEL:
+                mentions.append(value)
 
-            print(f'found {len(scraped)} channels')
-            configs = list(set(configs))
+        # A protocol name is enough, plenty of channels post their configs as files or screenshots
+        if not found_config and not PROTOCOL_HINT.search(message.text):
+            continue
 
+        if message.forward and hasattr(message.forward, 'chat') and hasattr(message.forward.chat, 'username') and message.forward.chat.broadcast:
+            channels.add(message.forward.chat.username)
+        channels.update(mentions)
 
+    print(f'group {chat}: {scanned} new messages, {len(configs)} configs, {len(sub_urls)} urls, {len(channels)} channels')
+    return max_id, configs, sub_urls, channels
 
-            scraped = {channel.lower() for channel in scraped if channel is not None}
 
-            verified_channels = set()
-            
-            async with aiohttp.ClientSession() as session:
-                await asyncio.gather(*(check_channel(channel, session, verified_channels) for channel in scraped))
+async def main():
+    timings = {}
+    store = GroupStore()
 
-            print(f'found {len(verified_channels)} working channels')
+    # Phase 1: collect the new messages from every group in parallel
+    with phase("collect", timings):
+        async with harness.telegram_client(SESSION, API_ID, API_HASH) as client:
+            scraped, results = await asyncio.gather(
+                load_previous_channels(),
+                asyncio.gather(*(collect_chat(client, chat, store.min_id(chat)) for chat in CHATS))
+            )
 
-            with open("data/tgchannels.json", "w") as fp:
-                data = {}
-                for k in verified_channels:
-                    data[k] = {
-                        "limit": 100
-                    }
-                
-                json.dump(data, fp, indent=4)
-            
-            print("Saving %d configs" % len(configs))
-            print("Saving %d sub urls" % len(sub_urls))
+    # Phase 2: merge the delta into the persistent store
+    with phase("dedup", timings):
+        for chat, (max_id, chat_configs, chat_urls, chat_channels) in zip(CHATS, results):
+            store.advance(chat, max_id)
+            store.merge("configs", chat_configs)
+            store.merge("urls", chat_urls)
+            store.merge("channels", (channel.lower() for channel in chat_channels if channel is not None))
 
-            with open("additional_configs.txt", "w") as ac_fp, open("additional_urls.txt", "w") as au_fp:
-                ac_fp.write("\n".join(configs))
-                au_fp.write("\n".join(sub_urls))
-            
+        configs = store.values("configs")
+        sub_urls = store.values("urls")
+        scraped = {channel.lower() for channel in scraped if channel is not None}
+        scraped.update(store.values("channels"))
+        store.save()
 
+        print(f'found {len(scraped)} channels')
 
-async def check_channel(channel, session, verified_channels):
-    try:
-        url = f"https://t.me/s/{channel}"
-        async with session.get(url, allow_redirects=False) as response:
-            if response.status == 200:
-                verified_channels.add(channel)
-                print('found the channel', channel)
+    # Phase 3: verify each unique channel once
+    with phase("verify", timings):
+        verifier = ChannelVerifier()
+        verified_channels = await verifier.verify(scraped)
+        verifier.save()
+
+        print(f'found {len(verified_channels)} working channels')
+
+    # Phase 4: write the results
+    with phase("write", timings):
+        with open("data/tgchannels.json", "w") as fp:
+            data = {}
+            for k in sorted(verified_channels):
+                data[k] = {
+                    "limit": 100
+                }
+
+            json.dump(data, fp, indent=4)
+
+        print("Saving %d configs" % len(configs))
+        print("Saving %d sub urls" % len(sub_urls))
+
+        with open("additional_configs.txt", "w") as ac_fp, open("additional_urls.txt", "w") as au_fp:
+            ac_fp.write("\n".join(configs))
+            au_fp.write("\n".join(sub_urls))
+
+    print("Phase timings:")
+    for name, elapsed in timings.items():
+        print(f"  {name:<8} {elapsed:8.2f}s")
+
+
+class ChannelVerifier:
+    """
+    Checks that channels have a public t.me/s/ preview, with bounded concurrency and
+    a persistent cache of positive and negative results.
+    """
+
+    def __init__(self, cache_path=CHANNEL_CACHE, concurrency=MAX_CONCURRENCY):
+        self.cache_path = cache_path
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.now = time()
+        self.hits = 0
+        self.checked = 0
+        self.errors = 0
+
+        try:
+            with open(cache_path) as fp:
+                self.cache = json.load(fp)
+        except (OSError, ValueError):
+            self.cache = {}
+
+    def cached(self, channel):
+        """Returns the cached result for a channel, or None if there is no fresh one."""
+        entry = self.cache.get(channel)
+        if entry is None:
+            return None
+
+        ttl = POSITIVE_TTL if entry["ok"] else NEGATIVE_TTL
+        if self.now - entry["checked"] > ttl:
+            return None
+
+        return entry["ok"]
+
+    async def check(self, channel, session):
+        """Requests the channel preview without downloading the page body."""
+        async with self.semaphore:
+            try:
+                url = f"https://t.me/s/{channel}"
+                async with harness.request(session, "GET", url, allow_redirects=False) as response:
+                    # Only the status line matters, the body is never read
+                    ok = response.status == 200
+            except Exception as e:
+                # Errors aren't cached, the channel is checked again next run
+                self.errors += 1
+                print(f'error checking channel {channel}: {e}')
+                return False
+
+        self.checked += 1
+        self.cache[channel] = {"ok": ok, "checked": int(self.now)}
+        print('found the channel' if ok else 'invalid channel', channel)
+        return ok
+
+    async def verify(self, channels):
+        """Returns the subset of channels that are public."""
+        verified = set()
+        pending = []
+
+        for channel in channels:
+            result = self.cached(channel)
+            if result is None:
+                pending.append(channel)
             else:
-                print('invalid channel', channel)
-    except Exception as e:
-        print(f'error checking channel {channel}: {e}')
+                self.hits += 1
+                if result:
+                    verified.add(channel)
+
+        start = perf_counter()
+        timeout = aiohttp.ClientTimeout(total=15)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            results = await asyncio.gather(*(self.check(channel, session) for channel in pending))
+        elapsed = perf_counter() - start
+
+        verified.update(channel for channel, ok in zip(pending, results) if ok)
+
+        total = self.hits + len(pending)
+        print(f'verification: {total} channels, cache hit rate {self.hits / total if total else 0:.0%}, '
+              f'{self.checked} checked ({self.errors} errors) in {elapsed:.2f}s '
+              f'({self.checked / elapsed if elapsed else 0:.1f} channels/s)')
+        return verified
+
+    def save(self):
+        """Drops expired entries and writes the cache back."""
+        cache = {
+            channel: entry for channel, entry in self.cache.items()
+            if self.now - entry["checked"] <= max(POSITIVE_TTL, NEGATIVE_TTL)
+        }
+
+        makedirs(path.dirname(self.cache_path), exist_ok=True)
+        with open(self.cache_path + ".tmp", "w") as fp:
+            json.dump(cache, fp, separators=(",", ":"))
+        replace(self.cache_path + ".tmp", self.cache_path)
+
 
 async def load_previous_channels():
     with open("data/tgchannels.json", "r") as fp:
@@ -100,13 +313,13 @@ async def load_previous_channels():
     channels = {i.lower() for i in data.keys()}
     
     async with aiohttp.ClientSession() as session:
-        async with session.get("https://raw.githubusercontent.com/M-logique/V2ray-Channel-Submit/refs/heads/main/channels.txt") as resp:
+        async with harness.request(session, "GET", "https://raw.githubusercontent.com/M-logique/V2ray-Channel-Submit/refs/heads/main/channels.txt") as resp:
             text = await resp.text()
 
             for channel_id in text.splitlines():
                 channels.add(channel_id.lower())
 
-    return set(data.keys())
+    return channels
 
 if __name__ == "__main__":
     start_time = datetime.now()
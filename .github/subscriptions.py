@@ -0,0 +1,169 @@
+import asyncio
+import base64
+import binascii
+import json
+from datetime import datetime
+from os import makedirs, path, replace
+from time import perf_counter, time
+from urllib.parse import urlparse
+
+import aiohttp
+
+import harness
+from extractor import iter_configs
+
+# Collected by refresh_channels.py
+URLS_FILE = "additional_urls.txt"
+
+# Picked up by the updater and deduplicated with everything else
+OUTPUT_FILE = "subscription_configs.txt"
+
+# Yield of every URL from previous runs
+YIELD_CACHE = "data/subscription_cache.json"
+
+# A URL that yielded nothing is skipped for this long before it's tried again
+EMPTY_TTL = 7 * 24 * 60 * 60
+
+MAX_CONCURRENCY = 20
+TIMEOUT = aiohttp.ClientTimeout(total=15, sock_connect=5)
+
+# Subscriptions are small text files, anything bigger isn't one
+MAX_BYTES = 5 * 1024 * 1024
+
+# Hosts that never serve subscriptions
+SKIP_HOSTS = {"t.me", "telegram.me", "www.t.me", "youtube.com", "www.youtube.com", "youtu.be", "instagram.com", "www.instagram.com"}
+
+
+def decode_base64(text):
+    """Decodes standard or urlsafe base64, tolerating missing padding and line breaks."""
+    data = "".join(text.split())
+    data += "=" * (-len(data) % 4)
+    try:
+        return base64.b64decode(data, altchars=b"-_" if ("-" in data or "_" in data) else None, validate=True).decode("utf-8", "replace")
+    except (binascii.Error, ValueError):
+        return ""
+
+
+def expand(body):
+    """Returns the share links in a subscription payload, plain or base64 encoded."""
+    text = body.decode("utf-8", "replace")
+
+    configs = list(iter_configs(text))
+    if configs:
+        return configs
+
+    return list(iter_configs(decode_base64(text)))
+
+
+def normalize_url(url):
+    if url.startswith("www."):
+        url = "https://" + url
+
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.netloc:
+        return None
+    if parsed.hostname in SKIP_HOSTS:
+        return None
+    return url
+
+
+async def read_limited(response, limit=MAX_BYTES):
+    """Reads a response body in chunks, returns None once it grows past limit."""
+    body = bytearray()
+    async for chunk in response.content.iter_chunked(64 * 1024):
+        body += chunk
+        if len(body) > limit:
+            return None
+    return bytes(body)
+
+
+class SubscriptionFetcher:
+    def __init__(self, cache_path=YIELD_CACHE, concurrency=MAX_CONCURRENCY):
+        self.cache_path = cache_path
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.now = int(time())
+        self.skipped = 0
+        self.failed = 0
+
+        try:
+            with open(cache_path) as fp:
+                self.cache = json.load(fp)
+        except (OSError, ValueError):
+            self.cache = {}
+
+    def should_fetch(self, url):
+        entry = self.cache.get(url)
+        return entry is None or entry["yield"] > 0 or self.now - entry["checked"] > EMPTY_TTL
+
+    async def fetch(self, url, session):
+        async with self.semaphore:
+            try:
+                async with harness.request(session, "GET", url, max_bytes=MAX_BYTES) as response:
+                    # Content-Length is only a hint, chunked responses don't send one
+                    body = None
+                    if response.status == 200 and (response.content_length or 0) <= MAX_BYTES:
+                        body = await read_limited(response)
+                    configs = expand(body) if body else []
+            except Exception as e:
+                # Errors aren't cached, the URL is tried again next run
+                self.failed += 1
+                print(f'error fetching {url}: {e}')
+                return []
+
+        self.cache[url] = {"yield": len(configs), "checked": self.now}
+        if configs:
+            print(f'{len(configs)} configs from {url}')
+        return configs
+
+    async def run(self, urls):
+        pending = []
+        for url in urls:
+            if self.should_fetch(url):
+                pending.append(url)
+            else:
+                self.skipped += 1
+
+        async with aiohttp.ClientSession(timeout=TIMEOUT) as session:
+            results = await asyncio.gather(*(self.fetch(url, session) for url in pending))
+
+        print(f'{len(urls)} urls: {len(pending)} fetched, {self.skipped} skipped by the yield cache, '
+              f'{self.failed} failed, {sum(1 for r in results if r)} were subscriptions')
+        return [config for configs in results for config in configs]
+
+    def save(self):
+        # Entries this old would be fetched again anyway, dropping them keeps the cache bounded
+        cache = {url: entry for url, entry in self.cache.items() if self.now - entry["checked"] <= EMPTY_TTL}
+
+        makedirs(path.dirname(self.cache_path), exist_ok=True)
+        with open(self.cache_path + ".tmp", "w") as fp:
+            json.dump(cache, fp, separators=(",", ":"))
+        replace(self.cache_path + ".tmp", self.cache_path)
+
+
+async def main():
+    try:
+        with open(URLS_FILE) as fp:
+            urls = [url for url in map(normalize_url, fp.read().splitlines()) if url]
+    except OSError as e:
+        print(f'no urls to expand: {e}')
+        return
+
+    urls = list(dict.fromkeys(urls))
+
+    start = perf_counter()
+    fetcher = SubscriptionFetcher()
+    configs = await fetcher.run(urls)
+    fetcher.save()
+
+    configs = list(dict.fromkeys(configs))
+    with open(OUTPUT_FILE, "w") as fp:
+        fp.write("\n".join(configs))
+
+    print(f'Saving {len(configs)} configs from subscriptions in {perf_counter() - start:.2f}s')
+
+
+if __name__ == "__main__":
+    start_time = datetime.now()
+    asyncio.run(main())
+    end_time = datetime.now()
+    print(f"Execution time: {end_time - start_time}")
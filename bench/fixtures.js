@@ -0,0 +1,127 @@
+const fs = require('node:fs');
+const path = require('node:path');
+const countries = require('../server/countries.json');
+
+const PROTOCOLS = ['vless', 'vmess', 'trojan', 'ss'];
+
+// Deterministic pseudo-random numbers, so two runs serve the same fixture
+function random(seed) {
+    let state = seed >>> 0;
+    return () => {
+        state = (state * 1664525 + 1013904223) >>> 0;
+        return state / 2 ** 32;
+    };
+}
+
+function configOf(next, i) {
+    const protocol = PROTOCOLS[i % PROTOCOLS.length];
+    const host = `${Math.floor(next() * 223) + 1}.${Math.floor(next() * 256)}.${Math.floor(next() * 256)}.${i % 256}`;
+    const id = Math.floor(next() * 2 ** 32).toString(16).padStart(8, '0');
+    if (protocol === 'vmess') {
+        const json = { v: '2', ps: `bench-${i}`, add: host, port: '443', id: `${id}-0000-4000-8000-${String(i).padStart(12, '0')}`, net: 'ws', tls: 'tls' };
+        return `vmess://${Buffer.from(JSON.stringify(json)).toString('base64')}`;
+    }
+    if (protocol === 'ss') {
+        return `ss://${Buffer.from(`chacha20-ietf-poly1305:${id}`).toString('base64')}@${host}:8388#bench-${i}`;
+    }
+    return `${protocol}://${id}-0000-4000-8000-${String(i).padStart(12, '0')}@${host}:443?security=tls&type=ws&path=%2F#bench-${i}`;
+}
+
+function writeCompact(file, byCode, names) {
+    const data = {
+        version: 1,
+        profiles: { url: [], protocol: [], country: [], latency: [] },
+        protocols: [],
+        countries: [],
+        byCountry: {},
+        byProtocol: {},
+        totalProfiles: 0
+    };
+    for (const [code, urls] of Object.entries(byCode)) {
+        const country = data.countries.push([code, names[code]]) - 1;
+        const start = data.profiles.url.length;
+        urls.forEach((url, rank) => {
+            const scheme = url.split('://')[0];
+            let protocol = data.protocols.indexOf(scheme);
+            if (protocol === -1) protocol = data.protocols.push(scheme) - 1;
+            (data.byProtocol[scheme] ??= []).push(data.profiles.url.length);
+            data.profiles.url.push(url);
+            data.profiles.protocol.push(protocol);
+            data.profiles.country.push(country);
+            data.profiles.latency.push(100 + rank);
+        });
+        data.byCountry[code] = [start, data.profiles.url.length];
+    }
+    data.totalProfiles = data.profiles.url.length;
+    fs.writeFileSync(file, JSON.stringify(data));
+}
+
+module.exports = {
+    /**
+     * Writes a proxies/ folder the size of `options` into `dir`:
+     *
+     *     configs    configs spread over the v2ray files and locations
+     *     files      number of proxies/v2ray files besides mix.txt
+     *     countries  number of locations in byLocation
+     *     layout     "legacy" (byLocation.json only) or "compact" (both files)
+     *
+     * Returns a summary of what was written.
+     */
+    generate: function (dir, { configs = 10000, files = 10, countries: countryCount = 30, layout = 'legacy', seed = 1 } = {}) {
+        const next = random(seed);
+        const root = path.join(dir, 'proxies');
+        fs.rmSync(root, { recursive: true, force: true });
+        for (const folder of ['v2ray', 'regular', 'tvc']) {
+            fs.mkdirSync(path.join(root, folder), { recursive: true });
+        }
+
+        const all = Array.from({ length: configs }, (_, i) => configOf(next, i));
+
+        // mix.txt holds everything, like the updater's output, the rest split it
+        fs.writeFileSync(path.join(root, 'v2ray', 'mix.txt'), all.join('\n'));
+        for (let f = 0; f < files; f++) {
+            const part = all.filter((_, i) => i % files === f);
+            fs.writeFileSync(path.join(root, 'v2ray', `channel-${f}.txt`), part.join('\n'));
+            fs.writeFileSync(path.join(root, 'tvc', `channel-${f}.txt`), part.join('\n'));
+        }
+        for (const name of ['http', 'socks4', 'socks5']) {
+            const hosts = Array.from({ length: Math.ceil(configs / 10) }, (_, i) => `10.${(i >> 8) & 255}.${i & 255}.1:${1080 + (i % 1000)}`);
+            fs.writeFileSync(path.join(root, 'regular', `${name}.txt`), hosts.join('\n'));
+        }
+
+        // The first countries of countries.json, each with a share of the configs
+        const picked = countries.slice(0, countryCount);
+        const byCode = {};
+        const names = {};
+        for (const url of all) {
+            const country = picked[Math.floor(next() * next() * picked.length)];
+            (byCode[country.code.toUpperCase()] ??= []).push(url);
+            names[country.code.toUpperCase()] = country.name.replace(/\b\w/g, char => char.toUpperCase());
+        }
+
+        const byName = Object.fromEntries(Object.entries(byCode).map(([code, urls]) => [names[code], urls]));
+        const legacy = {
+            totalProfiles: configs,
+            locations: {
+                totalCountries: Object.keys(byCode).length,
+                byNames: Object.keys(byName),
+                byCountryCode: Object.keys(byCode)
+            },
+            profilesByCountryCode: byCode,
+            profilesByCountryName: byName
+        };
+        fs.writeFileSync(path.join(root, 'byLocation.json'), JSON.stringify(legacy, null, 4));
+        if (layout === 'compact') {
+            writeCompact(path.join(root, 'byLocation.compact.json'), byCode, names);
+        }
+
+        const largest = Object.entries(byCode).sort((a, b) => b[1].length - a[1].length)[0];
+        return {
+            configs,
+            files,
+            countries: Object.keys(byCode).length,
+            layout,
+            largest: { code: largest[0], name: names[largest[0]], profiles: largest[1].length }
+        };
+    }
+};
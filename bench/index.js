@@ -0,0 +1,239 @@
+/**
+ * Load-test benchmark for the subscription server.
+ *
+ *     node bench [--configs 10000] [--files 10] [--countries 30]
+ *                [--layout legacy|compact|published]
+ *                [--connections 10] [--duration 10] [--warmup 2]
+ *                [--encoding gzip] [--only v2ray-file,location]
+ *                [--results bench/results] [--compare FILE] [--label TEXT]
+ *
+ * Writes a fixture proxies/ folder of the given size to a temp directory,
+ * starts index.js against it, drives each scenario below with keep-alive
+ * connections and reports requests per second, p50/p99 latency and the
+ * server's RSS. Every run is saved as JSON under --results and compared
+ * with the latest earlier run of the same fixture (or --compare).
+ */
+const fs = require('node:fs');
+const os = require('node:os');
+const path = require('node:path');
+const http = require('node:http');
+const { spawn, execFileSync } = require('node:child_process');
+const fixtures = require('./fixtures');
+const loadgen = require('./loadgen');
+
+const ROOT = path.join(__dirname, '..');
+
+// Scenario paths may use {location} and {name}, the largest fixture location
+const SCENARIOS = [
+    { name: 'v2ray-list', path: '/proxies/v2ray/' },
+    { name: 'v2ray-file', path: '/proxies/v2ray/mix?amount=100' },
+    { name: 'v2ray-file-all', path: '/proxies/v2ray/mix?decrypted' },
+    { name: 'v2ray-file-protocol', path: '/proxies/v2ray/channel-0?protocol=vless&amount=50' },
+    { name: 'location', path: '/proxies/v2ray/location/{location}?amount=100' },
+    { name: 'location-name', path: '/proxies/v2ray/location/{name}?protocol=vless&decrypted' },
+    { name: 'location-all', path: '/proxies/v2ray/location/{location}' },
+    { name: 'regular', path: '/proxies/regular/http?amount=100' },
+    { name: 'import', path: '/raw-import?url=@/proxies/v2ray/mix' }
+];
+
+const DEFAULTS = {
+    configs: 10000,
+    files: 10,
+    countries: 30,
+    layout: 'legacy',
+    connections: 10,
+    duration: 10,
+    warmup: 2,
+    encoding: 'gzip',
+    only: '',
+    results: path.join(__dirname, 'results'),
+    compare: '',
+    label: ''
+};
+
+function parseArgs(argv) {
+    const options = { ...DEFAULTS };
+    for (let i = 0; i < argv.length; i++) {
+        const key = argv[i].replace(/^--/, '');
+        if (!(key in DEFAULTS)) throw new Error(`Unknown option: ${argv[i]}`);
+        const value = argv[++i];
+        options[key] = typeof DEFAULTS[key] === 'number' ? Number(value) : value;
+    }
+    return options;
+}
+
+// Resident set size of a process in KB
+function rssOf(pid) {
+    try {
+        const status = fs.readFileSync(`/proc/${pid}/status`, 'utf8');
+        return Number(status.match(/VmRSS:\s+(\d+)/)[1]);
+    } catch {
+        return Number(execFileSync('ps', ['-o', 'rss=', '-p', String(pid)]).toString().trim()) || 0;
+    }
+}
+
+function commitOf() {
+    try {
+        const commit = execFileSync('git', ['rev-parse', '--short', 'HEAD'], { cwd: ROOT }).toString().trim();
+        const dirty = execFileSync('git', ['status', '--porcelain', '--', 'index.js', 'server'], { cwd: ROOT }).toString().trim();
+        return dirty ? `${commit}-dirty` : commit;
+    } catch {
+        return 'unknown';
+    }
+}
+
+function freePort() {
+    return new Promise(resolve => {
+        const server = http.createServer().listen(0, () => {
+            const { port } = server.address();
+            server.close(() => resolve(port));
+        });
+    });
+}
+
+async function waitFor(url, timeout = 30000) {
+    const end = Date.now() + timeout;
+    while (Date.now() < end) {
+        const ok = await new Promise(resolve => {
+            http.get(url, res => { res.resume(); resolve(res.statusCode < 500); }).on('error', () => resolve(false));
+        });
+        if (ok) return;
+        await new Promise(resolve => setTimeout(resolve, 100));
+    }
+    throw new Error(`Server didn't answer ${url} within ${timeout}ms`);
+}
+
+// index.js resolves routers and proxies/ from its working directory
+function prepare(dir, options) {
+    fs.mkdirSync(dir, { recursive: true });
+    fs.symlinkSync(path.join(ROOT, 'server'), path.join(dir, 'server'), 'dir');
+    const published = options.layout === 'published';
+    const fixture = fixtures.generate(dir, { ...options, layout: published ? 'compact' : options.layout });
+
+    if (published) {
+        fixture.layout = options.layout;
+        execFileSync('python3', [
+            path.join(ROOT, '.github', 'publish.py'),
+            '--input', path.join(dir, 'proxies', 'byLocation.compact.json'),
+            '--output', path.join(dir, 'proxies', 'published')
+        ], { stdio: 'ignore' });
+    }
+    return fixture;
+}
+
+function latest(resultsDir, options) {
+    if (!fs.existsSync(resultsDir)) return null;
+    const fixtureKey = ['configs', 'files', 'countries', 'layout', 'connections', 'encoding'];
+    const runs = fs.readdirSync(resultsDir)
+        .filter(file => file.endsWith('.json'))
+        .sort()
+        .reverse()
+        .map(file => path.join(resultsDir, file));
+    for (const file of runs) {
+        const run = JSON.parse(fs.readFileSync(file, 'utf8'));
+        if (fixtureKey.every(key => run.options[key] === options[key])) return file;
+    }
+    return null;
+}
+
+function change(now, before) {
+    if (!before) return '';
+    const delta = (now - before) / before * 100;
+    return ` (${delta >= 0 ? '+' : ''}${delta.toFixed(1)}%)`;
+}
+
+function report(run, baseline) {
+    const previous = baseline ? Object.fromEntries(baseline.scenarios.map(s => [s.name, s])) : {};
+    console.log(`\n${run.date} ${run.commit} node ${run.node} | ${run.options.configs} configs, ` +
+                `${run.fixture.countries} locations, ${run.options.layout} layout, ${run.options.connections} connections`);
+    console.log(`startup ${run.startup.ms.toFixed(0)}ms, idle RSS ${(run.startup.rss / 1024).toFixed(1)} MB`);
+    if (baseline) console.log(`compared with ${baseline.date} ${baseline.commit}`);
+    console.log('');
+    console.log(['scenario'.padEnd(22), 'req/s'.padStart(20), 'p50 ms'.padStart(10), 'p99 ms'.padStart(20),
+                 'errors'.padStart(7), 'RSS MB'.padStart(8), 'KB/req'.padStart(8)].join(' '));
+    for (const s of run.scenarios) {
+        const before = previous[s.name];
+        console.log([
+            s.name.padEnd(22),
+            (s.rps.toFixed(0) + change(s.rps, before && before.rps)).padStart(20),
+            s.p50.toFixed(2).padStart(10),
+            (s.p99.toFixed(2) + change(s.p99, before && before.p99)).padStart(20),
+            String(s.errors).padStart(7),
+            (s.rssPeak / 1024).toFixed(1).padStart(8),
+            (s.bytesPerRequest / 1024).toFixed(1).padStart(8)
+        ].join(' '));
+    }
+}
+
+async function main() {
+    const options = parseArgs(process.argv.slice(2));
+    const dir = fs.mkdtempSync(path.join(os.tmpdir(), 'proxies-bench-'));
+    let server;
+
+    try {
+        const fixture = prepare(dir, options);
+        const port = await freePort();
+        const base = `http://127.0.0.1:${port}`;
+
+        const started = process.hrtime.bigint();
+        server = spawn(process.execPath, [path.join(ROOT, 'index.js')], {
+            cwd: dir,
+            env: { ...process.env, PORT: String(port), FORCE_COLOR: '0' },
+            stdio: ['ignore', 'ignore', 'inherit']
+        });
+        await waitFor(`${base}/proxies/v2ray/`);
+        const startup = { ms: Number(process.hrtime.bigint() - started) / 1e6, rss: rssOf(server.pid) };
+
+        const only = options.only ? options.only.split(',') : null;
+        const headers = options.encoding === 'identity' ? {} : { 'accept-encoding': options.encoding };
+        const scenarios = [];
+
+        for (const scenario of SCENARIOS) {
+            if (only && !only.includes(scenario.name)) continue;
+            const url = base + scenario.path
+                .replace('{location}', fixture.largest.code)
+                .replace('{name}', encodeURIComponent(fixture.largest.name));
+
+            if (options.warmup > 0) {
+                await loadgen.run(url, { connections: options.connections, duration: options.warmup, headers });
+            }
+
+            let rssPeak = rssOf(server.pid);
+            const sampler = setInterval(() => { rssPeak = Math.max(rssPeak, rssOf(server.pid)); }, 200);
+            const result = await loadgen.run(url, { connections: options.connections, duration: options.duration, headers });
+            clearInterval(sampler);
+
+            scenarios.push({ name: scenario.name, path: url.slice(base.length), ...result, rssPeak, rssAfter: rssOf(server.pid) });
+            console.log(`${scenario.name}: ${result.rps.toFixed(0)} req/s, p99 ${result.p99.toFixed(2)}ms`);
+        }
+
+        const run = {
+            date: new Date().toISOString(),
+            commit: commitOf(),
+            label: options.label,
+            node: process.versions.node,
+            platform: `${os.platform()} ${os.arch()}, ${os.cpus().length} CPUs`,
+            options: { ...options, results: undefined, compare: undefined },
+            fixture,
+            startup,
+            scenarios
+        };
+
+        const baselineFile = options.compare || latest(options.results, options);
+        const baseline = baselineFile ? JSON.parse(fs.readFileSync(baselineFile, 'utf8')) : null;
+        report(run, baseline);
+
+        fs.mkdirSync(options.results, { recursive: true });
+        const file = path.join(options.results, `${run.date.replace(/[:.]/g, '-')}-${run.commit}.json`);
+        fs.writeFileSync(file, JSON.stringify(run, null, 2) + '\n');
+        console.log(`\nSaved ${path.relative(process.cwd(), file)}`);
+    } finally {
+        if (server) server.kill();
+        fs.rmSync(dir, { recursive: true, force: true });
+    }
+}
+
+main().catch(err => {
+    console.error(err);
+    process.exit(1);
+});
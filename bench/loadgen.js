@@ -0,0 +1,64 @@
+const http = require('node:http');
+
+function percentile(sorted, p) {
+    if (!sorted.length) return 0;
+    return sorted[Math.min(sorted.length - 1, Math.ceil(p / 100 * sorted.length) - 1)];
+}
+
+// Sends one request and resolves with its status, body size and latency in ms
+function send(agent, url, headers) {
+    return new Promise(resolve => {
+        const start = process.hrtime.bigint();
+        const req = http.get(url, { agent, headers }, res => {
+            let bytes = 0;
+            res.on('data', chunk => { bytes += chunk.length; });
+            res.on('end', () => resolve({
+                status: res.statusCode,
+                bytes,
+                latency: Number(process.hrtime.bigint() - start) / 1e6
+            }));
+        });
+        req.on('error', () => resolve({ status: 0, bytes: 0, latency: Number(process.hrtime.bigint() - start) / 1e6 }));
+    });
+}
+
+module.exports = {
+    percentile,
+
+    /**
+     * Keeps `connections` keep-alive connections busy with requests to `url`
+     * for `duration` seconds and returns throughput and latency figures.
+     * Any status outside 2xx/3xx counts as an error.
+     */
+    run: async function (url, { connections = 10, duration = 10, headers = {} } = {}) {
+        const agent = new http.Agent({ keepAlive: true, maxSockets: connections });
+        const latencies = [];
+        let errors = 0;
+        let bytes = 0;
+
+        const start = process.hrtime.bigint();
+        const end = Date.now() + duration * 1000;
+        const worker = async () => {
+            while (Date.now() < end) {
+                const result = await send(agent, url, headers);
+                latencies.push(result.latency);
+                bytes += result.bytes;
+                if (result.status < 200 || result.status >= 400) errors++;
+            }
+        };
+        await Promise.all(Array.from({ length: connections }, worker));
+        const elapsed = Number(process.hrtime.bigint() - start) / 1e9;
+        agent.destroy();
+
+        latencies.sort((a, b) => a - b);
+        return {
+            requests: latencies.length,
+            errors,
+            rps: latencies.length / elapsed,
+            p50: percentile(latencies, 50),
+            p99: percentile(latencies, 99),
+            max: latencies.length ? latencies[latencies.length - 1] : 0,
+            bytesPerRequest: latencies.length ? bytes / latencies.length : 0
+        };
+    }
+};
@@ -1,7 +1,12 @@
+import argparse
+import hashlib
+import heapq
 import json
 import os
 import secrets
+import signal
 import sys
+import time
 from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict, dataclass
 from glob import iglob
@@ -13,20 +18,110 @@ from string import ascii_letters, digits
 from typing import (Any, Dict, Generator, List, Optional, Sequence, Tuple,
                     Type, TypeVar)
 import importlib.util
-from sysconfig import get_config_var
 from uuid import uuid4
 
 # Setup directory paths
 # Get the root directory of the current script
 root_dir = os.path.dirname(os.path.abspath(__file__))
 
-# Attempt to get the workflow directory from the command-line arguments, defaulting to "." if not provided
-workflow_dir = next((arg for i, arg in enumerate(sys.argv) if i == 1), ".")
+def parse_shard(value: str) -> Tuple[int, int]:
+    """
+    Parses a shard spec like "3/20" into (index, count), index being 1-based.
+
+    :param value: The shard spec.
+    :type value: str
+    :return: The shard index and the shard count.
+    :rtype: Tuple[int, int]
+    """
+    try:
+        index, count = map(int, value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard {value!r}, expected i/N")
+
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"invalid shard {value!r}, i must be between 1 and N")
+    return index, count
+
+def parse_quota(value: str) -> Tuple[str, Optional[str], int]:
+    """
+    Parses a quota spec like "DE=200", "DE/vless=50" or "*=100" into
+    (country, protocol, count). "*" stands for every country on its own,
+    a missing protocol for all of them.
+
+    :param value: The quota spec.
+    :type value: str
+    :return: The country code, the protocol or None, and the number of working configs wanted.
+    :rtype: Tuple[str, Optional[str], int]
+    """
+    try:
+        bucket, count = value.rsplit("=", 1)
+        country, _, protocol = bucket.partition("/")
+        if not country or int(count) < 1:
+            raise ValueError
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid quota {value!r}, expected COUNTRY[/PROTOCOL]=N")
+    return country.upper(), protocol.lower() or None, int(count)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parses the command-line arguments of the checker.
+
+    :param argv: The arguments, defaulting to sys.argv[1:].
+    :type argv: Optional[List[str]]
+    :return: The parsed arguments.
+    :rtype: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(description="Checks the scraped V2ray configs and groups the working ones by location.")
+    parser.add_argument("workflow_dir", nargs="?", default=".", help="The workflow directory (default: .)")
+    parser.add_argument("--shard", type=parse_shard, metavar="i/N",
+                        help="Only check the i-th of N stable partitions of the configs")
+    parser.add_argument("--inventory", metavar="PATH",
+                        help="Also record the results in this SQLite inventory (e.g. data/inventory.sqlite3)")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Keep running and revalidate the configs continuously instead of checking them once")
+    parser.add_argument("--interval", type=float, default=300, metavar="SECONDS",
+                        help="How often the daemon publishes byLocation.json (default: 300)")
+    parser.add_argument("--batch", type=int, default=300, metavar="N",
+                        help="Configs the daemon checks per xray round (default: 300)")
+    parser.add_argument("--journal", metavar="PATH",
+                        help="Checkpoint file to resume an interrupted run from (default: WORKFLOW_DIR/checker.journal)")
+    parser.add_argument("--no-journal", action="store_true", help="Don't checkpoint the run")
+    parser.add_argument("--deadline", type=float, metavar="SECONDS",
+                        help="Finish within this many seconds, checking the most promising configs first")
+    parser.add_argument("--quota", type=parse_quota, action="append", default=[], metavar="COUNTRY[/PROTOCOL]=N",
+                        help="Stop checking configs that likely land in a country (and protocol) once N of them work; "
+                             "\"*\" is every country, split between the shards with --shard (repeatable)")
+    parser.add_argument("--history", metavar="PATH",
+                        help="SQLite inventory to read the check history from for --deadline and --quota "
+                             "(default: --inventory)")
+    return parser.parse_args(argv)
+
+# The workflow directory, set by configure()
+workflow_dir: str = "."
 
 
 # The folder where the JSON files will be saved
 JSON_FILES_DIR: str = f"{workflow_dir}/json_files"
+
+# Per-config outcomes and timings of this run, used by the chunker's cost model
+CHECK_STATS_PATH: str = f"{workflow_dir}/proxies/checkstats.json"
 XRAY_CORE_PATH: str = f"{root_dir}/xray"
+BY_LOCATION_PATH: str = f"{workflow_dir}/proxies/byLocation.json"
+
+# Checkpoint of the running check, so a restarted run resumes where it stopped
+JOURNAL_PATH: str = f"{workflow_dir}/checker.journal"
+
+# Configurations handed to one xray round
+CHUNK_SIZE: int = 300
+
+# Checks xray runs at the same time (MaxConcurrency in main.go)
+MAX_CONCURRENCY: int = 50
+
+# Longest a single check can take in seconds: waiting for xray's port plus the request (main.go)
+CHECK_TIMEOUT: float = 10
+
+# Seconds of a deadline kept for writing the results
+DEADLINE_MARGIN: float = 15
 
 
 # The folders containing the configuration files of V2ray.
@@ -35,18 +130,14 @@ folder_paths: Tuple[str, ...] = (
     "./proxies/tvc"
 )
 
-# Dynamically load the 'resources' module built with pybind11
-module_name: str = 'proxies'
-system_soabi: str = get_config_var("SOABI")
-
-# Construct the module path dynamically based on root directory and module name
-module_path = f'{root_dir}/{module_name}.so'
+# The 'proxies' module built from the Go core, loaded by configure()
+proxies: Any = None
 
-# Import 'proxies' module into the system
-spec = importlib.util.spec_from_file_location(module_name, module_path)
-proxies = importlib.util.module_from_spec(spec) #type: ignore
-sys.modules[module_name] = proxies
-spec.loader.exec_module(proxies) #type: ignore
+# Shared helpers live next to the other workflow scripts in .github
+sys.path.insert(0, os.path.join(os.path.dirname(root_dir), ".github"))
+from fingerprint import fingerprint
+from compact import scheme_of
+from inventory import Inventory
 
 TP = TypeVar("TP", bound="Payload")
 T = TypeVar("T")
@@ -152,9 +243,31 @@ class Output(Payload):
     :type url: str
     :param location: A Location object providing geographic details for the URL.
     :type location: Location
+    :param latency: Milliseconds taken by the location request through the proxy.
+    :type latency: int
+    :param elapsed: Milliseconds taken by the whole check.
+    :type elapsed: int
     """
     url: str
     location: Location
+    latency: int = 0
+    elapsed: int = 0
+
+@dataclass
+class Failure(Payload):
+    """
+    Represents a configuration that failed the check.
+
+    :param url: The URL of the failed configuration.
+    :type url: str
+    :param error: The reason the check failed.
+    :type error: str
+    :param elapsed: Milliseconds spent before the check failed.
+    :type elapsed: int
+    """
+    url: str
+    error: str
+    elapsed: int = 0
 
 @dataclass
 class ConfigPayload(Payload):
@@ -200,6 +313,7 @@ class CustomLogger(Logger):
 
         # Formatter for log messages
         formatter = Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+        self.formatter = formatter
 
         # Console handler for standard output
         console_handler = StreamHandler()
@@ -211,22 +325,38 @@ class CustomLogger(Logger):
 
         # File handler setup (if enabled)
         if log_to_file and log_file_path:
-            # Ensure the directory exists
-            os.makedirs(os.path.dirname(log_file_path), exist_ok = True)
-
-            # Use RotatingFileHandler to limit file size and rotate logs
-            file_handler = RotatingFileHandler(log_file_path,
-                                               maxBytes = max_log_size,
-                                               backupCount = backup_count)
-            file_handler.setFormatter(formatter)
-
-            self.addHandler(file_handler)
+            self.add_file_handler(log_file_path, max_log_size, backup_count)
 
         # Set the default logging level (INFO, DEBUG, etc.)
         self.setLevel(level)
 
         # Avoid duplicate handlers (handled by `hasHandlers()` check above)
 
+    def add_file_handler(self,
+                         log_file_path: str,
+                         max_log_size: int = 10 * 1024 * 1024,
+                         backup_count: int = 5) -> None:
+        """
+        Adds a rotating file handler, unless the logger already writes to a file.
+
+        :param log_file_path: Path to the log file.
+        :param max_log_size: Maximum size of the log file before rotation (default: 10MB).
+        :param backup_count: Number of backup log files to keep (default: 5).
+        """
+        if any(isinstance(handler, FileHandler) for handler in self.handlers):
+            return
+
+        # Ensure the directory exists
+        os.makedirs(os.path.dirname(log_file_path), exist_ok = True)
+
+        # Use RotatingFileHandler to limit file size and rotate logs
+        file_handler = RotatingFileHandler(log_file_path,
+                                           maxBytes = max_log_size,
+                                           backupCount = backup_count)
+        file_handler.setFormatter(self.formatter)
+
+        self.addHandler(file_handler)
+
     def log_to_console(self, level: int = INFO) -> None:
         """Logs a message to the console."""
         self.setLevel(level)
@@ -245,8 +375,37 @@ generate_unique_port = lambda: int(uuid4().int & (1<<16) -1) + 1024
 
 
 # Initialize a custom logger named "PPP" with default logging level INFO
-# This logger will output logs with a specified format to the console
-logger = CustomLogger("PPP", level = DEBUG, log_to_file = True, log_file_path = "logs/checker.log")
+# This logger will output logs with a specified format to the console,
+# and to logs/checker.log once configure() ran
+logger = CustomLogger("PPP", level = DEBUG)
+
+def configure(path: str = ".") -> None:
+    """
+    Sets the checker up to work in a workflow directory: points the output
+    paths at it, loads the 'proxies' module and starts logging to logs/checker.log.
+    Importing the module has no side effects, so callers other than the
+    command line (the pipeline's workers, the tests) call this themselves.
+
+    :param path: The workflow directory.
+    :type path: str
+    """
+    global workflow_dir, JSON_FILES_DIR, CHECK_STATS_PATH, BY_LOCATION_PATH, JOURNAL_PATH, proxies
+
+    workflow_dir = path
+    JSON_FILES_DIR = f"{workflow_dir}/json_files"
+    CHECK_STATS_PATH = f"{workflow_dir}/proxies/checkstats.json"
+    BY_LOCATION_PATH = f"{workflow_dir}/proxies/byLocation.json"
+    JOURNAL_PATH = f"{workflow_dir}/checker.journal"
+
+    # Import the 'proxies' module built from the Go core into the system, once
+    if proxies is None:
+        module_name: str = 'proxies'
+        spec = importlib.util.spec_from_file_location(module_name, f'{root_dir}/{module_name}.so')
+        proxies = importlib.util.module_from_spec(spec) #type: ignore
+        sys.modules[module_name] = proxies
+        spec.loader.exec_module(proxies) #type: ignore
+
+    logger.add_file_handler("logs/checker.log")
 
 def yield_txt_files(folder_path: str) -> Generator[str, None, None]:
     """Yields .txt files from the given folder.
@@ -302,18 +461,53 @@ def save_json(url: str, port: int) -> str:
     return os.path.abspath(file_path)
 
 
-def generate_json_files() -> List[Dict[Any, Any]]:
+def load_configs() -> List[str]:
     """
-    Generates JSON configuration files from proxy URLs and assigns unique ports to each.
+    Reads the configurations from the text files in the predefined folder paths.
 
-    Iterates through all text files in predefined folder paths, processes each line to
-    create a configuration, and saves it as a JSON file.
+    Configurations that only differ in their remark are kept once, in file order.
 
-    :return: A list of JSON file paths.
+    :return: The unique configuration URLs.
     :rtype: List[str]
     """
-    configs: List[Dict[Any, Any]] = []
+    configs: Dict[str, str] = {}
+
+    for folder_path in folder_paths:
+        for txt_file in sorted(yield_txt_files(folder_path)):
+            with open(txt_file, "r") as fp:
+                for line in fp:
+                    line = line.strip()
+                    if line:
+                        configs.setdefault(fingerprint(line), line)
+
+    return list(configs.values())
 
+def in_shard(config: str, index: int, count: int) -> bool:
+    """
+    Tells whether a configuration belongs to the given shard.
+
+    The partition is a hash of the configuration's fingerprint, so a config
+    always lands on the same shard no matter what else is in the input.
+
+    :param config: The configuration URL.
+    :type config: str
+    :param index: The 1-based shard index.
+    :type index: int
+    :param count: The number of shards.
+    :type count: int
+    :rtype: bool
+    """
+    return int(fingerprint(config), 16) % count == index - 1
+
+def generate_payloads(lines: List[str]) -> List[Dict[Any, Any]]:
+    """
+    Saves each configuration as a JSON file for xray and assigns it a port.
+
+    :param lines: The configuration URLs.
+    :type lines: List[str]
+    :return: The ConfigPayload dicts of the configurations that could be converted.
+    :rtype: List[Dict[Any, Any]]
+    """
     def process_line(line: str) -> Optional[Dict[Any, Any]]:
         port = generate_unique_port()
         try:
@@ -332,17 +526,28 @@ def generate_json_files() -> List[Dict[Any, Any]]:
             logger.error(f"Error generating JSON for URL '{line}': {err}")
             return None
 
-    for folder_path in folder_paths:
-        for txt_file in yield_txt_files(folder_path):
-            with open(txt_file, "r") as fp:
-                lines = [line.strip() for line in fp.readlines()]
+    with ThreadPoolExecutor() as executor:
+        results = list(executor.map(process_line, lines))
 
-            with ThreadPoolExecutor() as executor:
-                results = list(executor.map(process_line, lines))
+    return [result for result in results if result is not None]
+
+def input_configs(shard: Optional[Tuple[int, int]] = None) -> List[str]:
+    """
+    Returns the unique configurations to check, only the ones of the given shard if any.
+
+    :param shard: Optional (index, count) of the shard to check.
+    :type shard: Optional[Tuple[int, int]]
+    :return: The configuration URLs, in file order.
+    :rtype: List[str]
+    """
+    lines = load_configs()
+    total = len(lines)
 
-            configs.extend([result for result in results if result is not None])
+    if shard is not None:
+        lines = [line for line in lines if in_shard(line, *shard)]
+        logger.info("Shard %d/%d: %d of %d unique configs", shard[0], shard[1], len(lines), total)
 
-    return configs
+    return lines
 
 def chunks(data: Sequence[T], chunk_size: int) -> Generator[Sequence[T], None, None]:
     """
@@ -359,125 +564,844 @@ def chunks(data: Sequence[T], chunk_size: int) -> Generator[Sequence[T], None, N
         yield data[i:i + chunk_size]
 
 
-def generate_input_payload() -> InputPayload:
+def check_stats(outputs: List[Output], failures: List[Failure], elapsed: float, skipped: int = 0) -> Dict[str, Any]:
+    """
+    Returns the outcome and duration of every checked configuration, as
+    saved in checkstats.json.
+
+    :param outputs: The configurations that passed the check.
+    :type outputs: List[Output]
+    :param failures: The configurations that failed the check.
+    :type failures: List[Failure]
+    :param elapsed: Wall time of the whole run in seconds.
+    :type elapsed: float
+    :param skipped: How many configurations were left unchecked.
+    :type skipped: int
+    :rtype: Dict[str, Any]
+    """
+    results = [[output.url, 1, output.elapsed] for output in outputs]
+    results += [[failure.url, 0, failure.elapsed] for failure in failures]
+    return {"elapsed": round(elapsed, 2), "skipped": skipped, "results": results}
+
+def save_check_stats(outputs: List[Output], failures: List[Failure], elapsed: float, skipped: int = 0) -> None:
+    """
+    Saves the outcome and duration of every checked configuration.
+
+    :param outputs: The configurations that passed the check.
+    :type outputs: List[Output]
+    :param failures: The configurations that failed the check.
+    :type failures: List[Failure]
+    :param elapsed: Wall time of the whole run in seconds.
+    :type elapsed: float
+    :param skipped: How many configurations were left unchecked.
+    :type skipped: int
+    """
+    with open(CHECK_STATS_PATH, "w") as fp:
+        json.dump(check_stats(outputs, failures, elapsed, skipped), fp)
+
+def record_inventory(path: str, outputs: List[Output], failures: List[Failure]) -> None:
     """
-    Generates an InputPayload object containing configurations for proxy servers.
+    Records the outcome of every checked configuration in the inventory.
+
+    :param path: Path of the SQLite inventory.
+    :type path: str
+    :param outputs: The configurations that passed the check.
+    :type outputs: List[Output]
+    :param failures: The configurations that failed the check.
+    :type failures: List[Failure]
+    """
+    results = [
+        (output.url, True, output.latency, output.elapsed,
+         output.location.countryCode, output.location.country.replace("Türkiye", "Turkey"))
+        for output in outputs
+    ]
+    results += [(failure.url, False, None, failure.elapsed, None, None) for failure in failures]
+
+    with Inventory(path) as inventory:
+        count = inventory.record_checks(results)
 
-    Uses `generate_json_files` to create configuration files and wraps the resulting
-    JSON file paths into an InputPayload instance.
+    logger.info("Recorded %d check results in %s", count, path)
+
+def check_configs(configs: List[Dict[Any, Any]]) -> Tuple[List[Output], List[Failure]]:
+    """
+    Checks one chunk of configurations with xray and parses the results.
 
-    :return: An InputPayload object with all configurations.
-    :rtype: InputPayload
+    :param configs: ConfigPayload dicts of the configurations to check.
+    :type configs: List[Dict[Any, Any]]
+    :return: The configurations that passed and the ones that failed.
+    :rtype: Tuple[List[Output], List[Failure]]
     """
-    json_files = generate_json_files()
-    return InputPayload(
-        configs=json_files
+    outputs: List[Output] = []
+    failures: List[Failure] = []
+
+    # Process proxies using the given input and xray core file path
+    result: str = proxies.process_proxies(
+        json_input=InputPayload(configs=list(configs)).to_json(),
+        xray_core_file_path=XRAY_CORE_PATH
     )
 
-def main():
+    try:
+        # Parse the JSON response from the proxy processor
+        loaded_outputs: Any = json.loads(result)
+
+        # Extract and store output data
+        for obj in loaded_outputs["outputs"] or []:
+            outputs.append(
+                Output(
+                    url=obj.get("url"),
+                    location=Location.from_dict(obj.get("location")),
+                    latency=obj.get("latency", 0),
+                    elapsed=obj.get("elapsed", 0)
+                )
+            )
+
+        for obj in loaded_outputs.get("failures") or []:
+            failures.append(Failure.from_dict(obj))
+    except (json.JSONDecodeError, TypeError, Exception) as err:
+        # Log an error if data parsing fails
+        logger.error("Failed to parse data: %s, exception: %s", err, type(err).__name__)
+
+    return outputs, failures
+
+def check_lines(lines: List[str]) -> Tuple[List[Output], List[Failure]]:
+    """
+    Saves the xray configs of a chunk of configurations, checks them and
+    removes the JSON files again.
+
+    Configurations that can't be converted count as failed.
+
+    :param lines: The configuration URLs.
+    :type lines: List[str]
+    :return: The configurations that passed and the ones that failed.
+    :rtype: Tuple[List[Output], List[Failure]]
+    """
+    payloads = generate_payloads(lines)
+
+    try:
+        outputs, failures = check_configs(payloads) if payloads else ([], [])
+    finally:
+        for payload in payloads:
+            try:
+                os.remove(payload["jsonFilePath"])
+            except OSError:
+                pass
+
+    converted = {payload["url"] for payload in payloads}
+    failures += [Failure(url=line, error="could not generate the xray config") for line in lines if line not in converted]
+
+    return outputs, failures
+
+def build_by_location(outputs: List[Output]) -> Dict[str, Any]:
+    """
+    Groups the working configurations by location in the byLocation.json layout.
+
+    :param outputs: The configurations that passed the check.
+    :type outputs: List[Output]
+    :return: The byLocation dict.
+    :rtype: Dict[str, Any]
+    """
+    # Initialize sets to track unique country codes and names
+    locations_by_cc: set = set()
+    locations_by_names: set = set()
+
+    # Final dictionary to store processed data
+    final_dict: Dict[str, Any] = {
+        "totalProfiles": len(outputs),   # Total number of profiles
+        "locations": {
+            "totalCountries": 0,         # Total number of unique countries
+            "byNames": [],               # List of unique country names
+            "byCountryCode": []          # List of unique country codes
+        },
+        "profilesByCountryCode": {},     # URLs grouped by country code
+        "profilesByCountryName": {},
+        "scores": {}                     # Latency of every URL, used by combine.py to rank them
+    }
+
+    # Process each output to populate the final dictionary
+    for output in outputs:
+        # Add country code and name to their respective sets
+        locations_by_cc.add(output.location.countryCode)
+        locations_by_names.add(output.location.country)
+
+        # Retrieve country code and URL for the current output
+        cc: str = output.location.countryCode
+        url: str = output.url
+        country_name: str = output.location.country.replace("Türkiye", "Turkey") 
+        # Türkiye will showup in json like this: T\u00fcrkiye
+        # So we need to replace it with "Turkey"
+
+        final_dict["scores"][url] = output.latency
+
+        # Group URLs by country code
+        final_dict["profilesByCountryCode"].setdefault(cc, []).append(url)
+
+        # Group URLs by country name
+        final_dict["profilesByCountryName"].setdefault(country_name, []).append(url)
+
+    # Populate the final dictionary with unique counts and data
+    final_dict["locations"]["totalCountries"] = len(locations_by_cc)
+    final_dict["locations"]["byNames"] = list(name for name in locations_by_names if name != "Türkiye")
+    final_dict["locations"]["byCountryCode"] = list(locations_by_cc)
+
+    return final_dict
+
+def write_by_location(outputs: List[Output]) -> None:
+    """
+    Writes byLocation.json, replacing the previous file in one rename so
+    readers never see a partial file.
+
+    :param outputs: The configurations that passed the check.
+    :type outputs: List[Output]
+    """
+    with open(BY_LOCATION_PATH + ".tmp", "w") as fp:
+        json.dump(build_by_location(outputs), fp, indent=4)
+    os.replace(BY_LOCATION_PATH + ".tmp", BY_LOCATION_PATH)
+
+def load_history(path: Optional[str]) -> Dict[str, Tuple]:
+    """
+    Reads the check history of every configuration from the inventory.
+
+    :param path: Path of the SQLite inventory, or None.
+    :type path: Optional[str]
+    :return: (first seen, last checked, last ok, checks, successes, country) by fingerprint,
+             empty when there is no inventory.
+    :rtype: Dict[str, Tuple]
+    """
+    if not path or not os.path.exists(path):
+        return {}
+
+    with Inventory(path) as inventory:
+        return inventory.history()
+
+def success_probability(entry: Optional[Tuple]) -> float:
+    """
+    Estimates how likely a configuration passes its next check from its history.
+
+    Configurations never checked get an even chance, the others their
+    smoothed success rate averaged with the outcome of their latest check.
+
+    :param entry: The configuration's inventory history, or None.
+    :type entry: Optional[Tuple]
+    :rtype: float
+    """
+    if entry is None or not entry[3]:
+        return 0.5
+
+    _, _, last_ok, checks, successes, _ = entry
+    return 0.5 * (successes + 1) / (checks + 2) + 0.5 * bool(last_ok)
+
+def schedule(lines: List[str], history: Dict[str, Tuple]) -> List[str]:
+    """
+    Orders the configurations by expected value: likely working ones first,
+    fresh ones before older ones of the same chance, known-dead ones last.
+
+    :param lines: The configuration URLs.
+    :type lines: List[str]
+    :param history: The check history by fingerprint, see `load_history`.
+    :type history: Dict[str, Tuple]
+    :rtype: List[str]
+    """
+    def key(line: str) -> Tuple[float, float]:
+        entry = history.get(fingerprint(line))
+        return -success_probability(entry), -(entry[0] if entry else float("inf"))
+
+    return sorted(lines, key=key)
+
+def affordable(remaining: float) -> int:
+    """
+    Returns how many configurations can still be checked in `remaining`
+    seconds, even if every one of them times out.
+
+    :param remaining: Seconds left until the deadline.
+    :type remaining: float
+    :rtype: int
+    """
+    waves = int((remaining - DEADLINE_MARGIN) // CHECK_TIMEOUT)
+    return max(0, waves) * MAX_CONCURRENCY
+
+class Quotas:
+    """
+    Counts the working configurations of every quota bucket, to tell which
+    candidates aren't worth checking any more.
+
+    A candidate is dropped when the inventory places it in a country whose
+    every matching quota is met; configurations of an unknown country, or
+    matching no quota, are always checked.
+    """
+
+    def __init__(self, quotas: List[Tuple[str, Optional[str], int]], shards: int = 1):
+        """
+        :param quotas: (country, protocol, count) quotas, see `parse_quota`.
+        :type quotas: List[Tuple[str, Optional[str], int]]
+        :param shards: Number of shards the quotas are split between.
+        :type shards: int
+        """
+        self.quotas = [(country, protocol, -(-count // shards)) for country, protocol, count in quotas]
+        self.counts: Dict[Tuple[int, str], int] = {}
+
+    def buckets(self, country: str, protocol: str) -> List[Tuple[Tuple[int, str], int]]:
+        """
+        Returns the (bucket, limit) of every quota a configuration counts towards.
+
+        :rtype: List[Tuple[Tuple[int, str], int]]
+        """
+        return [
+            ((i, country), limit)
+            for i, (quota_country, quota_protocol, limit) in enumerate(self.quotas)
+            if quota_country in ("*", country) and quota_protocol in (None, protocol)
+        ]
+
+    def add(self, outputs: List[Output]) -> bool:
+        """
+        Counts working configurations towards their quotas.
+
+        :param outputs: The configurations that passed the check.
+        :type outputs: List[Output]
+        :return: Whether a quota got met.
+        :rtype: bool
+        """
+        met = False
+        for output in outputs:
+            for bucket, limit in self.buckets(output.location.countryCode, scheme_of(output.url)):
+                self.counts[bucket] = self.counts.get(bucket, 0) + 1
+                met = met or self.counts[bucket] == limit
+        return met
+
+    def met(self, country: Optional[str], protocol: str) -> bool:
+        """
+        Tells whether every quota a configuration would count towards is met.
+
+        :param country: The country the configuration was last seen in, or None.
+        :type country: Optional[str]
+        :param protocol: The configuration's protocol.
+        :type protocol: str
+        :rtype: bool
+        """
+        if not country:
+            return False
+        buckets = self.buckets(country, protocol)
+        return bool(buckets) and all(self.counts.get(bucket, 0) >= limit for bucket, limit in buckets)
+
+    def drop_met(self, lines: List[str], predicted: Dict[str, Tuple[Optional[str], float]]) -> List[str]:
+        """
+        Returns the configurations not expected to land in a met quota.
+
+        :param lines: The configuration URLs still to check.
+        :type lines: List[str]
+        :param predicted: The country each configuration was last seen in, if known,
+                          and its chance to pass, by URL.
+        :type predicted: Dict[str, Tuple[Optional[str], float]]
+        :rtype: List[str]
+        """
+        return [line for line in lines if not self.met(predicted[line][0], scheme_of(line))]
+
+    def next_chunk(self, lines: List[str], size: int,
+                   predicted: Dict[str, Tuple[Optional[str], float]]) -> Tuple[List[str], List[str]]:
+        """
+        Takes the next chunk to check, deferring candidates whose quotas the
+        chunk is already expected to meet. Deferred candidates stay at the
+        front of the rest, so they are checked next if the chunk falls short.
+
+        :param lines: The configuration URLs still to check, in order.
+        :type lines: List[str]
+        :param size: The most configurations to take.
+        :type size: int
+        :param predicted: See `drop_met`.
+        :type predicted: Dict[str, Tuple[Optional[str], float]]
+        :return: The chunk and the configurations left.
+        :rtype: Tuple[List[str], List[str]]
+        """
+        expected: Dict[Tuple[int, str], float] = {}
+        chunk: List[str] = []
+        deferred: List[str] = []
+
+        taken = 0
+        for line in lines:
+            if len(chunk) == size:
+                break
+            taken += 1
+
+            country, probability = predicted[line]
+            buckets = self.buckets(country, scheme_of(line)) if country else []
+            if buckets and all(self.counts.get(bucket, 0) + expected.get(bucket, 0) >= limit
+                               for bucket, limit in buckets):
+                deferred.append(line)
+                continue
+
+            chunk.append(line)
+            for bucket, _ in buckets:
+                expected[bucket] = expected.get(bucket, 0) + probability
+
+        if not chunk:
+            # Only deferred candidates are left, their quotas may still fall short
+            return deferred[:size], deferred[size:] + lines[taken:]
+        return chunk, deferred + lines[taken:]
+
+class Journal:
+    """
+    Append-only checkpoint of a checker run.
+
+    The first line identifies the input, every further line holds the results
+    of one checked chunk. A run that finds a journal of the same input loads
+    those results and only checks the configurations not in it; a journal of
+    another input is started over. Lines are flushed to disk as they are
+    written, so a run killed at any point loses at most the chunk in flight.
+    """
+
+    def __init__(self, path: str, configs: List[str], shard: Optional[Tuple[int, int]] = None):
+        """
+        Opens the journal of the given input, loading what a previous run of it completed.
+
+        :param path: Path of the journal file.
+        :type path: str
+        :param configs: The configurations this run checks.
+        :type configs: List[str]
+        :param shard: Optional (index, count) of the shard to check.
+        :type shard: Optional[Tuple[int, int]]
+        """
+        self.path = path
+        self.header = {
+            "input": hashlib.sha256("\n".join(sorted(map(fingerprint, configs))).encode()).hexdigest()[:16],
+            "shard": "%d/%d" % shard if shard else None
+        }
+        self.outputs: List[Output] = []
+        self.failures: List[Failure] = []
+        self.done: set = set()
+        self.position = 0
+        self.elapsed = 0.0
+
+        if not self.load():
+            with open(path, "w") as fp:
+                fp.write(json.dumps(self.header) + "\n")
+        self.fp = open(path, "a")
+
+    def load(self) -> bool:
+        """
+        Reads the chunks a previous run of the same input completed, and cuts
+        off a line left unfinished by a kill so new entries start on a line
+        of their own.
+
+        :return: Whether the journal belongs to this input.
+        :rtype: bool
+        """
+        try:
+            with open(self.path, "rb") as fp:
+                lines = fp.read().splitlines(keepends=True)
+        except OSError:
+            return False
+
+        try:
+            if not lines or not lines[0].endswith(b"\n") or json.loads(lines[0]) != self.header:
+                return False
+        except ValueError:
+            return False
+
+        # Bytes up to the end of the last complete entry
+        valid = len(lines[0])
+        for line in lines[1:]:
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError
+                entry = json.loads(line)
+            except ValueError:
+                # A line cut short by the kill, its chunk is checked again
+                break
+            self.outputs += [
+                Output(url=obj["url"], location=Location.from_dict(obj["location"]),
+                       latency=obj.get("latency", 0), elapsed=obj.get("elapsed", 0))
+                for obj in entry["outputs"]
+            ]
+            self.failures += [Failure.from_dict(obj) for obj in entry["failures"]]
+            self.position = entry["position"]
+            self.elapsed = entry["elapsed"]
+            valid += len(line)
+
+        os.truncate(self.path, valid)
+
+        self.done = {fingerprint(result.url) for result in [*self.outputs, *self.failures]}
+        return True
+
+    def record(self, outputs: List[Output], failures: List[Failure], position: int, elapsed: float) -> None:
+        """
+        Appends the results of a checked chunk.
+
+        :param outputs: The configurations of the chunk that passed.
+        :type outputs: List[Output]
+        :param failures: The configurations of the chunk that failed.
+        :type failures: List[Failure]
+        :param position: How many configurations of the input are done with this chunk.
+        :type position: int
+        :param elapsed: Seconds spent on the input so far, previous runs included.
+        :type elapsed: float
+        """
+        entry = {
+            "position": position,
+            "elapsed": round(elapsed, 2),
+            "outputs": [output.to_dict() for output in outputs],
+            "failures": [failure.to_dict() for failure in failures]
+        }
+        self.fp.write(json.dumps(entry) + "\n")
+        self.fp.flush()
+        os.fsync(self.fp.fileno())
+
+    def remove(self) -> None:
+        """Deletes the journal once the run's results are written."""
+        self.fp.close()
+        os.remove(self.path)
+
+def main(args: argparse.Namespace) -> None:
     """
     Main function to process proxies, collect outputs, and generate a final JSON result.
+
+    :param args: The parsed command-line arguments.
+    :type args: argparse.Namespace
     """
+    start_time: float = time.perf_counter()
+
     # Ensure the directory for storing JSON files exists
     if not os.path.exists(JSON_FILES_DIR): 
         os.makedirs(JSON_FILES_DIR)
 
-    # Generate the input payload for processing
-    input_payload: InputPayload = generate_input_payload()
+    lines: List[str] = input_configs(args.shard)
 
-    # List to store processed outputs
+    # Lists to store processed outputs and failed configurations
     outputs: List[Output] = []
+    failures: List[Failure] = []
+
+    # Pick up where an interrupted run of the same input stopped
+    journal: Optional[Journal] = None
+    if not args.no_journal:
+        journal = Journal(args.journal or JOURNAL_PATH, lines, args.shard)
+        if journal.done:
+            logger.info("Resuming from %s: %d of %d configs already checked",
+                        journal.path, len(journal.done), len(lines))
+        outputs += journal.outputs
+        failures += journal.failures
+        start_time -= journal.elapsed
+
+    done = journal.done if journal else set()
+    pending = [line for line in lines if fingerprint(line) not in done]
+
+    # With a deadline or quotas, the configs most likely to work go first so the cut hits the least useful ones
+    history: Dict[str, Tuple] = {}
+    if args.deadline or args.quota:
+        history = load_history(args.history or args.inventory)
+        pending = schedule(pending, history)
+        logger.info("Scheduled %d configs (%d with history)",
+                    len(pending), sum(1 for line in pending if fingerprint(line) in history))
+
+    deadline: Optional[float] = None
+    if args.deadline:
+        deadline = time.perf_counter() + args.deadline
+        logger.info("Deadline in %.0fs", args.deadline)
+
+    quotas: Optional[Quotas] = None
+    predicted: Dict[str, Tuple[Optional[str], float]] = {}
+    skipped_quota = 0
+    met = False
+    if args.quota:
+        quotas = Quotas(args.quota, args.shard[1] if args.shard else 1)
+        if not history:
+            logger.warning("No check history to predict countries from, the quotas won't skip anything")
+        met = quotas.add(outputs)
+        for line in pending:
+            entry = history.get(fingerprint(line))
+            predicted[line] = (entry[5] if entry else None, success_probability(entry))
+
+    # Process the configurations in chunks of 300
+    checked = 0
+    while pending:
+        if quotas and met:
+            # Candidates last seen in a country whose quotas are met would only add to it
+            remaining = quotas.drop_met(pending, predicted)
+            skipped_quota += len(pending) - len(remaining)
+            pending = remaining
+            met = False
+            if not pending:
+                break
+
+        size = CHUNK_SIZE
+        if deadline is not None:
+            # Only launch what can finish even if every check runs into its timeout
+            size = min(size, affordable(deadline - time.perf_counter()))
+            if not size:
+                break
+
+        if quotas:
+            chunk, pending = quotas.next_chunk(pending, size, predicted)
+        else:
+            chunk, pending = pending[:size], pending[size:]
+        checked += len(chunk)
+
+        chunk_outputs, chunk_failures = check_lines(chunk)
+        outputs += chunk_outputs
+        failures += chunk_failures
+        if quotas:
+            met = quotas.add(chunk_outputs)
+
+        if journal:
+            journal.record(chunk_outputs, chunk_failures, len(outputs) + len(failures),
+                           time.perf_counter() - start_time)
 
-    # Process the input payload in chunks of 300 configurations
-    for chunk in chunks(input_payload.configs, 300):
-        # Create a smaller InputPayload object for the current chunk
-        liter_input_payload: InputPayload = InputPayload(
-            configs=list(chunk)
-        )
-        
-        # Process proxies using the given input and xray core file path
-        result: str = proxies.process_proxies(
-            json_input=liter_input_payload.to_json(),
-            xray_core_file_path=XRAY_CORE_PATH
-        )
-
-        # Parse the JSON response from the proxy processor
-        loaded_outputs: Any = json.loads(result)
-
-        try:
-            # Extract and store output data
-            for obj in loaded_outputs["outputs"]:
-                outputs.append(
-                    Output(
-                        url=obj.get("url"),
-                        location=Location.from_dict(obj.get("location"))
-                    )
-                )
-        except (json.JSONDecodeError, TypeError, Exception) as err:
-            # Log an error if data parsing fails
-            logger.error("Failed to parse data: %s, exception: %s", err, type(err).__name__)
-        
         # Log the current count of collected outputs
         logger.info("Current outputs: %d", len(outputs))
 
-    else:
-        # Initialize sets to track unique country codes and names
-        locations_by_cc: set = set()
-        locations_by_names: set = set()
-
-        # Final dictionary to store processed data
-        final_dict: Dict[str, Any] = {
-            "totalProfiles": len(outputs),   # Total number of profiles
-            "locations": {
-                "totalCountries": 0,         # Total number of unique countries
-                "byNames": [],               # List of unique country names
-                "byCountryCode": []          # List of unique country codes
-            },
-            "profilesByCountryCode": {},     # URLs grouped by country code
-            "profilesByCountryName": {}
-        }
+    if deadline is not None:
+        logger.info("Checked %d configs before the deadline, skipped %d for lack of time",
+                    checked, len(pending))
+    if quotas:
+        logger.info("Skipped %d configs expected in a country whose quota is met", skipped_quota)
+    if deadline is not None or quotas:
+        # A partial result is only useful if the best configs of each country come first
+        outputs.sort(key=lambda output: (not output.latency, output.latency))
 
-        # Process each output to populate the final dictionary
-        for output in outputs:
-            # Add country code and name to their respective sets
-            locations_by_cc.add(output.location.countryCode)
-            locations_by_names.add(output.location.country)
-
-            # Retrieve country code and URL for the current output
-            cc: str = output.location.countryCode
-            url: str = output.url
-            country_name: str = output.location.country.replace("Türkiye", "Turkey") 
-            # Türkiye will showup in json like this: T\u00fcrkiye
-            # So we need to replace it with "Turkey"
-
-            # Group URLs by country code
-            final_dict["profilesByCountryCode"][cc] = (
-                final_dict["profilesByCountryCode"].get(cc, []) + [url]
-            )
+    # Write the final dictionary to a JSON file
+    write_by_location(outputs)
 
-            # Group URLs by country name
-            final_dict["profilesByCountryName"][country_name] = (
-                final_dict["profilesByCountryName"].get(country_name, []) + [url]
-            )
+    # Save the outcomes for the chunker's cost model
+    save_check_stats(outputs, failures, time.perf_counter() - start_time, len(pending) + skipped_quota)
 
-        # Populate the final dictionary with unique counts and data
-        final_dict["locations"]["totalCountries"] = len(locations_by_cc)
-        final_dict["locations"]["byNames"] = list(name for name in locations_by_names if name != "Türkiye")
-        final_dict["locations"]["byCountryCode"] = list(locations_by_cc)
+    if args.inventory:
+        record_inventory(args.inventory, outputs, failures)
 
-        # Write the final dictionary to a JSON file
-        with open(f"{workflow_dir}/proxies/byLocation.json", "w") as fp:
-            json.dump(final_dict, fp, indent=4)
+    if journal:
+        journal.remove()
 
-            
 
+@dataclass
+class ConfigState:
+    """
+    What the daemon knows about one configuration between checks.
+
+    :param url: The configuration URL.
+    :type url: str
+    :param first_seen: When the configuration first showed up in the input.
+    :type first_seen: float
+    :param last_checked: When it was last checked, 0 if never.
+    :type last_checked: float
+    :param checks: How many times it was checked.
+    :type checks: int
+    :param successes: How many of those checks passed.
+    :type successes: int
+    :param output: The latest result if the latest check passed.
+    :type output: Optional[Output]
+    """
+    url: str
+    first_seen: float
+    last_checked: float = 0
+    checks: int = 0
+    successes: int = 0
+    output: Optional[Output] = None
+
+    @property
+    def reliability(self) -> float:
+        """Share of passed checks, smoothed so one result doesn't decide it."""
+        return (self.successes + 1) / (self.checks + 2)
+
+    def priority(self, now: float) -> Tuple[int, float]:
+        """
+        Sort key of the revalidation queue, lowest first.
+
+        Configs never checked come first, newest first. The rest are ordered by
+        staleness weighted by reliability, so working configs are rechecked
+        often and dead ones only once in a while.
+        """
+        if not self.checks:
+            return 0, -self.first_seen
+        return 1, -(now - self.last_checked) * (0.25 + self.reliability)
+
+def input_signature() -> Tuple[Tuple[str, float, int], ...]:
+    """
+    Identifies the current input files, changing whenever one is added, removed or rewritten.
+
+    :rtype: Tuple[Tuple[str, float, int], ...]
+    """
+    signature = []
+    for folder_path in folder_paths:
+        for txt_file in sorted(yield_txt_files(folder_path)):
+            stat = os.stat(txt_file)
+            signature.append((txt_file, stat.st_mtime, stat.st_size))
+    return tuple(signature)
+
+def sync_states(states: Dict[str, ConfigState], shard: Optional[Tuple[int, int]] = None) -> Tuple[int, int]:
+    """
+    Adds the configurations new in the input and drops the ones gone from it.
+
+    :param states: The daemon's states by fingerprint, updated in place.
+    :type states: Dict[str, ConfigState]
+    :param shard: Optional (index, count) of the shard to check.
+    :type shard: Optional[Tuple[int, int]]
+    :return: How many configs were added and removed.
+    :rtype: Tuple[int, int]
+    """
+    now = time.time()
+    current: Dict[str, str] = {}
+    for line in load_configs():
+        if shard is None or in_shard(line, *shard):
+            current[fingerprint(line)] = line
+
+    removed = [key for key in states if key not in current]
+    for key in removed:
+        del states[key]
+
+    added = 0
+    for key, line in current.items():
+        if key not in states:
+            states[key] = ConfigState(url=line, first_seen=now)
+            added += 1
+        else:
+            # The updater may have written a different remark
+            states[key].url = line
+
+    return added, len(removed)
+
+def seed_states(states: Dict[str, ConfigState], path: str) -> int:
+    """
+    Carries the check history over from the inventory, so a restarted daemon
+    doesn't treat every config as new. Configs whose latest check passed get
+    that result back, so the first publish after a restart still lists them.
+
+    :param states: The daemon's states by fingerprint, updated in place.
+    :type states: Dict[str, ConfigState]
+    :param path: Path of the SQLite inventory.
+    :type path: str
+    :return: How many states got a history.
+    :rtype: int
+    """
+    with Inventory(path) as inventory:
+        history = inventory.history()
+        passed = inventory.last_passed()
+
+    seeded = 0
+    for key, state in states.items():
+        if key in history and history[key][1]:
+            _, last_checked, _, checks, successes, _ = history[key]
+            state.last_checked, state.checks, state.successes = last_checked, checks, successes
+            seeded += 1
+
+        if key in passed:
+            code, name, latency = passed[key]
+            location = Location(query="", country=name, countryCode=code, region="", regionName="", city="", status="success")
+            state.output = Output(url=state.url, location=location, latency=latency or 0)
+    return seeded
+
+def check_batch(batch: List[ConfigState]) -> Tuple[List[Output], List[Failure]]:
+    """
+    Checks a batch of configurations and updates their states.
+
+    :param batch: The states of the configurations to check.
+    :type batch: List[ConfigState]
+    :return: The configurations that passed and the ones that failed.
+    :rtype: Tuple[List[Output], List[Failure]]
+    """
+    by_url = {state.url: state for state in batch}
+    outputs, failures = check_lines(list(by_url))
+
+    now = time.time()
+    passed = {output.url: output for output in outputs}
+    for url, state in by_url.items():
+        state.last_checked = now
+        state.checks += 1
+        state.output = passed.get(url)
+        if state.output:
+            state.successes += 1
+
+    return outputs, failures
+
+def run_daemon(interval: float, batch_size: int, shard: Optional[Tuple[int, int]] = None,
+               inventory_path: Optional[str] = None) -> None:
+    """
+    Keeps checking the configurations in priority order and publishes
+    byLocation.json every `interval` seconds, until SIGTERM or Ctrl+C.
+
+    The input folders are rescanned before each batch when they changed, so
+    the updater can keep writing them while the daemon runs.
+
+    :param interval: Seconds between two publishes.
+    :type interval: float
+    :param batch_size: Configurations checked per xray round.
+    :type batch_size: int
+    :param shard: Optional (index, count) of the shard to check.
+    :type shard: Optional[Tuple[int, int]]
+    :param inventory_path: Optional SQLite inventory to seed the history from and record the results in.
+    :type inventory_path: Optional[str]
+    """
+    stopping = False
+
+    def stop(signum: int, frame: Any) -> None:
+        nonlocal stopping
+        logger.info("Received signal %d, stopping after the current batch", signum)
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    if not os.path.exists(JSON_FILES_DIR):
+        os.makedirs(JSON_FILES_DIR)
+
+    states: Dict[str, ConfigState] = {}
+    signature: Tuple = ()
+    seeded = inventory_path is None
+    last_publish = time.monotonic()
+
+    # Results since the last publish, for the inventory
+    outputs: List[Output] = []
+    failures: List[Failure] = []
+
+    def publish() -> None:
+        working = [state.output for state in states.values() if state.output]
+        write_by_location(working)
+        if inventory_path and (outputs or failures):
+            record_inventory(inventory_path, outputs, failures)
+        logger.info("Published %d working of %d configs (%d checked since the last publish)",
+                    len(working), len(states), len(outputs) + len(failures))
+        outputs.clear()
+        failures.clear()
+
+    while not stopping:
+        current = input_signature()
+        if current != signature:
+            added, removed = sync_states(states, shard)
+            signature = current
+            logger.info("Input changed: %d new, %d removed, %d configs", added, removed, len(states))
+            if not seeded:
+                logger.info("Seeded the history of %d configs from %s", seed_states(states, inventory_path), inventory_path)
+                seeded = True
+
+        now = time.time()
+        batch = heapq.nsmallest(batch_size, states.values(), key=lambda state: state.priority(now))
+
+        if batch:
+            started = time.perf_counter()
+            new = sum(1 for state in batch if not state.checks)
+            batch_outputs, batch_failures = check_batch(batch)
+            outputs += batch_outputs
+            failures += batch_failures
+            logger.info("Checked %d configs (%d new): %d passed in %.1fs",
+                        len(batch), new, len(batch_outputs), time.perf_counter() - started)
+        else:
+            # Nothing to check until the input has configs
+            time.sleep(min(interval, 10))
+
+        if time.monotonic() - last_publish >= interval:
+            publish()
+            last_publish = time.monotonic()
+
+    if outputs or failures:
+        publish()
 
 
 if __name__ == "__main__":
-    
+    args = parse_args()
+
     # Check if the specified workflow directory exists
-    if not os.path.exists(workflow_dir):
-        logger.error(f"Error: Specified workflow directory does not exist: {workflow_dir}")
+    if not os.path.exists(args.workflow_dir):
+        logger.error(f"Error: Specified workflow directory does not exist: {args.workflow_dir}")
         sys.exit(1)
 
-    main()
+    configure(args.workflow_dir)
+
+    if args.daemon:
+        run_daemon(args.interval, args.batch, args.shard, args.inventory)
+    else:
+        main(args)
@@ -40,6 +40,14 @@ type LocationResponse struct {
 type Output struct {
 	URL      string           `json:"url"`
 	Location LocationResponse `json:"location"`
+	Latency  int64            `json:"latency"` // ms taken by the location request through the proxy
+	Elapsed  int64            `json:"elapsed"` // ms taken by the whole check
+}
+
+type Failure struct {
+	URL     string `json:"url"`
+	Error   string `json:"error"`
+	Elapsed int64  `json:"elapsed"`
 }
 
 type InputData struct {
@@ -47,7 +55,8 @@ type InputData struct {
 }
 
 type OutputData struct {
-	Outputs []*Output `json:"outputs"`
+	Outputs  []*Output  `json:"outputs"`
+	Failures []*Failure `json:"failures"`
 }
 
 func WaitForPort(port int, timeout time.Duration) error {
@@ -129,20 +138,21 @@ func runXrayCore(jsonFilePath string, xrayCorePath string) *os.Process {
 func checkConfig(xrayCorePath string, jsonFilePath string, port int, url string) (*Output, error) {
 	log.Printf("Running XrayCore on port: %v, with the json: %s\n", port, jsonFilePath)
 
+	start := time.Now()
 	process := runXrayCore(jsonFilePath, xrayCorePath)
+	if process == nil {
+		return nil, fmt.Errorf("failed to run XrayCore on port: %v, with the json: %s", port, jsonFilePath)
+	}
+	defer process.Kill()
+
 	err := WaitForPort(port, 5 * time.Second)
 	if err != nil {
 		return nil, fmt.Errorf("failed to wait for port: %s", err)
 	}
-	
-	if process == nil {
-		return nil, fmt.Errorf("failed to run XrayCore on port: %v, with the json: %s", port, jsonFilePath)
-	}
 
+	requestStart := time.Now()
 	location, err := getLocationByPort(port)
 
-	process.Kill()
-
 	if err != nil {
 		return nil, err
 	}
@@ -150,6 +160,8 @@ func checkConfig(xrayCorePath string, jsonFilePath string, port int, url string)
 	output := Output{
 		Location: *location,
 		URL: url,
+		Latency: time.Since(requestStart).Milliseconds(),
+		Elapsed: time.Since(start).Milliseconds(),
 	}
 
 	return &output, nil
@@ -170,12 +182,14 @@ func chunkConfigs(configs []Config, chunkSize int) [][]Config {
 
 
 
-func handleInputData(input InputData, xrayCorePath string) ([]*Output, error) {
+func handleInputData(input InputData, xrayCorePath string) ([]*Output, []*Failure, error) {
 	var allResults []*Output
+	var allFailures []*Failure
 	chunks := chunkConfigs(input.Configs, 300)
 
 	var wg sync.WaitGroup
 	resultChan := make(chan *Output, len(input.Configs))
+	failureChan := make(chan *Failure, len(input.Configs))
 	semaphore := make(chan struct{}, MaxConcurrency)
 
 	for _, chunk := range chunks {
@@ -187,9 +201,15 @@ func handleInputData(input InputData, xrayCorePath string) ([]*Output, error) {
 				defer wg.Done()
 				defer func() { <-semaphore }()
 
+				start := time.Now()
 				result, err := checkConfig(xrayCorePath, config.JsonFilePath, config.Port, config.URL)
 				if err != nil {
 					log.Printf("Error checking the config: %s\n", err)
+					failureChan <- &Failure{
+						URL:     config.URL,
+						Error:   err.Error(),
+						Elapsed: time.Since(start).Milliseconds(),
+					}
 					return
 				}
 				log.Printf("Found location %s for config %s", result.Location.Country, result.URL)
@@ -200,12 +220,17 @@ func handleInputData(input InputData, xrayCorePath string) ([]*Output, error) {
 
 	wg.Wait()
 	close(resultChan)
+	close(failureChan)
 
 	for result := range resultChan {
 		allResults = append(allResults, result)
 	}
 
-	return allResults, nil
+	for failure := range failureChan {
+		allFailures = append(allFailures, failure)
+	}
+
+	return allResults, allFailures, nil
 }
 
 //export ProcessProxies
@@ -222,7 +247,7 @@ func ProcessProxies(jsonInput *C.char, xrayCorePath *C.char) *C.char {
 		return C.CString(fmt.Sprintf("Error: Failed to parse json: %v", err))
 	}
 
-	output, err := handleInputData(input, goXrayCorePath)
+	output, failures, err := handleInputData(input, goXrayCorePath)
 
 	if err != nil {
 		return C.CString(fmt.Sprintf("Error: %v", err))
@@ -231,7 +256,8 @@ func ProcessProxies(jsonInput *C.char, xrayCorePath *C.char) *C.char {
 
 
 	jsonBytes, err := json.Marshal(OutputData{
-		Outputs: output,
+		Outputs:  output,
+		Failures: failures,
 	})
 	if err != nil {
 		return C.CString(fmt.Sprintf("Error: Error marshaling struct: %v", err))
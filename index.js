@@ -44,8 +44,11 @@ for (const router of routers) {
     logger.success(`('${router}' - '${r.path}') router loaded!`)
 }
 
-server.listen(port, async () => {
-    logger.log(`App is listening on port ${port}`);
+// PORT overrides config.json, the benchmark starts the server on a free port
+const listenPort = Number(process.env.PORT) || port;
+
+server.listen(listenPort, async () => {
+    logger.log(`App is listening on port ${listenPort}`);
 })
 
 
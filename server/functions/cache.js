@@ -0,0 +1,93 @@
+const fs = require('node:fs');
+const variants = require('./variant');
+
+// Most distinct (protocol, amount, encoding) bodies kept per file
+const MAX_VARIANTS = 64;
+
+const files = new Map();
+const folders = new Map();
+
+// Returns the cached entry of a file, reloading it when its mtime or size changed
+function load(filePath) {
+    let stat;
+    try {
+        stat = fs.statSync(filePath);
+    } catch {
+        files.delete(filePath);
+        return null;
+    }
+
+    let entry = files.get(filePath);
+    if (!entry || entry.mtimeMs !== stat.mtimeMs || entry.size !== stat.size) {
+        const content = fs.readFileSync(filePath);
+        entry = {
+            mtimeMs: stat.mtimeMs,
+            size: stat.size,
+            content,
+            configs: null,
+            views: new Map(),
+            bodies: new Map()
+        };
+        files.set(filePath, entry);
+    }
+    return entry;
+}
+
+// Configs of a file starting with the protocol, computed once per file version
+function view(entry, protocol) {
+    if (!entry.configs) entry.configs = entry.content.toString('utf8').split('\n');
+    if (!protocol) return entry.configs;
+
+    let configs = entry.views.get(protocol);
+    if (!configs) {
+        configs = entry.configs.filter(config => config.startsWith(protocol));
+        entry.views.set(protocol, configs);
+    }
+    return configs;
+}
+
+module.exports = {
+    /**
+     * Returns the subscription body of a file for the given protocol, amount
+     * and encoding as a variant (see variant.js), or null if the file doesn't exist.
+     */
+    body: function (filePath, protocol, amount, base64) {
+        const entry = load(filePath);
+        if (!entry) return null;
+
+        const key = `${protocol || ''}|${amount || ''}|${base64 ? 'b64' : 'plain'}`;
+        let variant = entry.bodies.get(key);
+        if (variant) return variant;
+
+        const joined = view(entry, protocol).slice(0, amount).join('\n\n');
+        variant = variants.create(base64 ? Buffer.from(joined, 'utf8').toString('base64') : joined);
+
+        // Maps keep insertion order, the oldest variant goes first
+        if (entry.bodies.size >= MAX_VARIANTS) {
+            entry.bodies.delete(entry.bodies.keys().next().value);
+        }
+        entry.bodies.set(key, variant);
+        return variant;
+    },
+
+    // The file's content as is, as a variant
+    file: function (filePath) {
+        const entry = load(filePath);
+        if (!entry) return null;
+
+        if (!entry.raw) entry.raw = variants.create(entry.content);
+        return entry.raw;
+    },
+
+    // Cached directory listing, refreshed when the folder's mtime changes
+    list: function (folderPath) {
+        const { mtimeMs } = fs.statSync(folderPath);
+
+        let cached = folders.get(folderPath);
+        if (!cached || cached.mtimeMs !== mtimeMs) {
+            cached = { mtimeMs, names: fs.readdirSync(folderPath) };
+            folders.set(folderPath, cached);
+        }
+        return cached.names;
+    }
+};
@@ -0,0 +1,102 @@
+const fs = require('node:fs');
+const path = require('node:path');
+
+// See .github/compact.py for the format
+const compactPath = path.join(process.cwd(), 'proxies', 'byLocation.compact.json');
+const legacyPath = path.join(process.cwd(), 'proxies', 'byLocation.json');
+
+let cached = { file: null, mtimeMs: -1, locations: null };
+
+function fromLegacy(json) {
+    const codeOf = {};
+    for (const [code, urls] of Object.entries(json.profilesByCountryCode || {})) {
+        for (const url of urls) codeOf[url] = code;
+    }
+    const names = {};
+    for (const [name, urls] of Object.entries(json.profilesByCountryName || {})) {
+        const url = urls.find(url => url in codeOf);
+        if (url) (names[codeOf[url]] ??= []).push(name);
+    }
+
+    const data = {
+        profiles: { url: [], protocol: [], country: [], latency: [] },
+        protocols: [],
+        countries: [],
+        byCountry: {},
+        byProtocol: {}
+    };
+    for (const [code, urls] of Object.entries(json.profilesByCountryCode || {})) {
+        const country = data.countries.push([code, ...(names[code] || [])]) - 1;
+        const start = data.profiles.url.length;
+        for (const url of new Set(urls)) {
+            const scheme = url.split('://')[0].toLowerCase();
+            let protocol = data.protocols.indexOf(scheme);
+            if (protocol === -1) protocol = data.protocols.push(scheme) - 1;
+            (data.byProtocol[scheme] ??= []).push(data.profiles.url.length);
+            data.profiles.url.push(url);
+            data.profiles.protocol.push(protocol);
+            data.profiles.country.push(country);
+            data.profiles.latency.push(0);
+        }
+        data.byCountry[code] = [start, data.profiles.url.length];
+    }
+    return data;
+}
+
+class Locations {
+    constructor(data) {
+        this.profiles = data.profiles;
+        this.protocols = data.protocols;
+        this.countries = data.countries;
+        this.byCountry = data.byCountry;
+        this.byProtocol = data.byProtocol;
+
+        // Maps, so a request for "constructor" or "__proto__" can't hit Object.prototype
+        this.names = new Map();
+        this.aliases = new Map();
+        for (const [code, ...names] of this.countries) {
+            this.names.set(code, names[0] || code);
+            this.aliases.set(code.toLowerCase(), code);
+            for (const name of names) this.aliases.set(name.toLowerCase(), code);
+        }
+    }
+
+    get total() {
+        return this.profiles.url.length;
+    }
+
+    // Resolves a country code or name, case-insensitively
+    code(location) {
+        return this.aliases.get(location.toLowerCase());
+    }
+
+    // Ranked URLs of a location, or null for an unknown one
+    urls(location) {
+        const code = this.code(location);
+        if (!code || !Object.hasOwn(this.byCountry, code)) return null;
+        const [start, end] = this.byCountry[code];
+        return this.profiles.url.slice(start, end);
+    }
+
+    name(code) {
+        return this.names.get(code) || code;
+    }
+}
+
+module.exports = {
+    /**
+     * Loads the compact byLocation file, or converts the legacy one when the
+     * compact file doesn't exist. Reloaded whenever the file's mtime changes.
+     */
+    load: function () {
+        const file = fs.existsSync(compactPath) ? compactPath : legacyPath;
+        const { mtimeMs } = fs.statSync(file);
+
+        if (cached.file !== file || cached.mtimeMs !== mtimeMs) {
+            const json = JSON.parse(fs.readFileSync(file, 'utf8'));
+            const locations = new Locations(json.version === 1 ? json : fromLegacy(json));
+            cached = { file, mtimeMs, locations };
+        }
+        return cached.locations;
+    }
+};
@@ -0,0 +1,109 @@
+const compact = require('./compact');
+const variants = require('./variant');
+const logger = require('./logger');
+const countries = require('../countries.json');
+
+// Most distinct (protocol, amount, encoding) bodies kept per location
+const MAX_VARIANTS = 64;
+
+let index = { source: null, aliases: new Map() };
+
+function flagOf(code) {
+    const codePoints = code.toUpperCase().split('').map(char => 127397 + char.charCodeAt(0));
+    return String.fromCodePoint(...codePoints);
+}
+
+// Display name and flag, as utils.getName/getFlag would compute them for this alias
+function displayOf(alias, code) {
+    const country = countries.find(item => item.name === alias || item.code === alias)
+        || countries.find(item => item.code === code.toLowerCase());
+    const name = (country ? country.name : alias).toUpperCase().replaceAll('-', '');
+    const flag = flagOf(country ? country.code : code);
+    return { name, flag, title: `${flag} Github: M-logique/Proxies | ${name}` };
+}
+
+function build(locations) {
+    const start = process.hrtime.bigint();
+    const aliases = new Map();
+    const entries = new Map();
+    let bytes = 0;
+
+    const add = (alias, code) => {
+        alias = alias.toLowerCase();
+        if (aliases.has(alias)) return;
+
+        if (!entries.has(code)) {
+            const urls = locations.urls(code);
+            entries.set(code, { code, urls, views: new Map(), bodies: new Map() });
+            bytes += urls.length * 8;
+        }
+        const entry = { ...displayOf(alias, code), location: entries.get(code) };
+        aliases.set(alias, entry);
+        bytes += (alias.length + entry.name.length + entry.title.length) * 2 + 64;
+    };
+
+    for (const [code, ...names] of locations.countries) {
+        add(code, code);
+        for (const name of names) {
+            add(name, code);
+            // "The Netherlands" and "Netherlands" are the same place
+            add(name.replace(/^the /i, ''), code);
+            add(`the ${name}`, code);
+        }
+    }
+    // Names countries.json knows for a code the checker only reported under another name
+    for (const country of countries) {
+        const code = locations.code(country.code);
+        if (code) add(country.name, code);
+    }
+
+    const elapsed = Number(process.hrtime.bigint() - start) / 1e6;
+    logger.log(`Location index built: ${entries.size} locations, ${aliases.size} aliases, ` +
+               `~${(bytes / 1024).toFixed(1)} KB of index over ${locations.total} profiles in ${elapsed.toFixed(2)}ms`);
+
+    return { source: locations, aliases };
+}
+
+// Configs of a location starting with the protocol, computed once per index
+function view(location, protocol) {
+    if (!protocol) return location.urls;
+
+    let urls = location.views.get(protocol);
+    if (!urls) {
+        urls = location.urls.filter(url => url.startsWith(protocol));
+        location.views.set(protocol, urls);
+    }
+    return urls;
+}
+
+module.exports = {
+    // Returns the index, rebuilt when byLocation changed on disk
+    get: function () {
+        const locations = compact.load();
+        if (index.source !== locations) index = build(locations);
+        return index;
+    },
+
+    // Display metadata and profiles of a location alias, or null
+    lookup: function (alias) {
+        return this.get().aliases.get(alias.toLowerCase()) || null;
+    },
+
+    // The body of a location for the protocol, amount and encoding, as a variant
+    body: function (entry, protocol, amount, base64) {
+        const location = entry.location;
+        const key = `${protocol || ''}|${amount || ''}|${base64 ? 'b64' : 'plain'}`;
+
+        let variant = location.bodies.get(key);
+        if (variant) return variant;
+
+        const joined = view(location, protocol).slice(0, amount).join('\n\n');
+        variant = variants.create(base64 ? Buffer.from(joined, 'utf8').toString('base64') : joined);
+
+        if (location.bodies.size >= MAX_VARIANTS) {
+            location.bodies.delete(location.bodies.keys().next().value);
+        }
+        location.bodies.set(key, variant);
+        return variant;
+    }
+};
@@ -0,0 +1,56 @@
+const fs = require('node:fs');
+const path = require('node:path');
+
+// Written by .github/publish.py after every combine
+const publishedDir = path.join(process.cwd(), 'proxies', 'published');
+const manifestPath = path.join(publishedDir, 'manifest.json');
+
+let cached = { mtimeMs: -1, manifest: null };
+
+function loadManifest() {
+    let stat;
+    try {
+        stat = fs.statSync(manifestPath);
+    } catch {
+        return null;
+    }
+
+    if (stat.mtimeMs !== cached.mtimeMs) {
+        try {
+            cached = { mtimeMs: stat.mtimeMs, manifest: JSON.parse(fs.readFileSync(manifestPath, 'utf8')) };
+        } catch {
+            return null;
+        }
+    }
+    return cached.manifest;
+}
+
+module.exports = {
+    /**
+     * Finds the published file for a location request.
+     * Returns `{ path, sha256, bytes }` or null when the variant isn't published.
+     */
+    lookup: function (location, protocol, amount, base64) {
+        const manifest = loadManifest();
+        if (!manifest) return null;
+
+        const code = manifest.aliases[location.toLowerCase()];
+        const entry = code && manifest.locations[code];
+        if (!entry) return null;
+
+        const group = protocol || 'all';
+        const count = group === 'all' ? entry.total : entry.protocols[group];
+        if (!count) return null;
+
+        let size;
+        if (amount === undefined || amount >= count) size = 'all';
+        else if (manifest.sizes.includes(amount)) size = amount;
+        else return null;
+
+        const variant = entry.variants[`${group}-${size}`];
+        if (!variant) return null;
+
+        const file = variant[base64 ? 'base64' : 'plain'];
+        return { ...file, path: path.join(publishedDir, file.path) };
+    }
+};
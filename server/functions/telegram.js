@@ -0,0 +1,137 @@
+const { request } = require('undici') // undici is used for making HTTP requests
+const { parse } = require('node-html-parser'); // Used for parsing HTML
+
+// How long the configs of a channel are served from memory
+const TTL = 5 * 60 * 1000;
+
+// Most channels kept in memory, the oldest scrape is dropped first
+const MAX_CHANNELS = 500;
+
+// Pages of one channel fetched at the same time
+const PAGE_CONCURRENCY = 4;
+
+// Messages on one t.me/s page
+const PAGE_SIZE = 20;
+
+// Regular expression to match VPN configuration URLs
+const pattern = /(?:vless|wireguard|vmess|ss|trojan):\/\/[^\s#]+(?:#[^\s]*)?/g;
+
+// channel -> { pages, expires, configs }
+const cache = new Map();
+
+// `${channel}:${pages}` -> Promise of the configs
+const inflight = new Map();
+
+class ScrapeError extends Error {
+    constructor(message, status) {
+        super(message);
+        this.status = status;
+    }
+}
+
+async function fetchPage(channel, before) {
+    const url = before ? `https://t.me/s/${channel}?before=${before}` : `https://t.me/s/${channel}`;
+    const { body, statusCode } = await request(url);
+
+    if (statusCode === 302) {
+        await body.dump();
+        throw new ScrapeError('Channel didn\'t allow scraping', 404);
+    }
+
+    const html = parse(await body.text());
+
+    // Messages are listed oldest first, each with its id in data-post="channel/123"
+    const messages = html.querySelectorAll('.tgme_widget_message').map(message => ({
+        id: Number((message.getAttribute('data-post') || '').split('/').pop()) || 0,
+        text: (message.querySelector('.tgme_widget_message_text') || {}).innerText || ''
+    }));
+    const more = html.querySelector('.tme_messages_more');
+
+    return { messages, before: more ? Number(more.getAttribute('data-before')) : null };
+}
+
+// Runs the tasks with at most `limit` of them in flight
+async function mapLimit(items, limit, task) {
+    const results = new Array(items.length);
+    let next = 0;
+    const worker = async () => {
+        while (next < items.length) {
+            const i = next++;
+            results[i] = await task(items[i]);
+        }
+    };
+    await Promise.all(new Array(Math.min(limit, items.length)).fill(0).map(worker));
+    return results;
+}
+
+async function scrape(channel, pages) {
+    const first = await fetchPage(channel);
+    const results = [first];
+
+    // Once the first cursor is known, guess the older pages `PAGE_SIZE` ids apart
+    // and fetch them together. Gaps in the ids make these pages overlap.
+    if (first.before && pages > 1) {
+        const cursors = [];
+        for (let i = 0; i < pages - 1 && first.before - i * PAGE_SIZE > 1; i++) {
+            cursors.push(first.before - i * PAGE_SIZE);
+        }
+        results.push(...await mapLimit(cursors, PAGE_CONCURRENCY, before => fetchPage(channel, before)));
+    }
+
+    const messages = results.flatMap(result => result.messages);
+    const ids = new Set(messages.map(message => message.id));
+
+    // Make up for the overlap by paging on from the oldest message seen, unless
+    // some page already reached the start of the channel
+    let cursor = results.some(result => !result.before) ? null : Math.min(...results.map(result => result.before));
+    while (cursor && ids.size < pages * PAGE_SIZE) {
+        const result = await fetchPage(channel, cursor);
+        for (const message of result.messages) {
+            messages.push(message);
+            ids.add(message.id);
+        }
+        cursor = result.before && result.before < cursor ? result.before : null;
+    }
+
+    // Newest first, every message once
+    const seen = new Set();
+    const texts = messages
+        .sort((a, b) => b.id - a.id)
+        .filter(message => !seen.has(message.id) && seen.add(message.id))
+        .map(message => message.text);
+
+    // Extract VPN configs from messages, filter out null matches, and replace HTML entities
+    return texts.flatMap(str => str.match(pattern)).filter(item => item).map(str => str.replaceAll('&amp;', '&'));
+}
+
+module.exports = {
+    ScrapeError,
+
+    /**
+     * Returns the configs of the newest `pages` pages of a channel, newest first.
+     * Results are cached for `TTL`, and concurrent requests share one scrape.
+     */
+    getConfigs: function (channel, pages) {
+        channel = channel.toLowerCase();
+
+        const cached = cache.get(channel);
+        if (cached && cached.expires > Date.now() && cached.pages >= pages) {
+            return Promise.resolve(cached.configs);
+        }
+
+        const key = `${channel}:${pages}`;
+        if (inflight.has(key)) return inflight.get(key);
+
+        const promise = scrape(channel, pages)
+            .then(configs => {
+                cache.delete(channel);
+                if (cache.size >= MAX_CHANNELS) cache.delete(cache.keys().next().value);
+                cache.set(channel, { pages, expires: Date.now() + TTL, configs });
+                return configs;
+            })
+            .finally(() => inflight.delete(key));
+
+        inflight.set(key, promise);
+        return promise;
+    }
+};
@@ -0,0 +1,52 @@
+const crypto = require('node:crypto');
+const zlib = require('node:zlib');
+
+// Encodings are compressed once per variant, so the strongest settings pay off
+const encoders = {
+    br: body => zlib.brotliCompressSync(body, {
+        params: {
+            [zlib.constants.BROTLI_PARAM_QUALITY]: 9,
+            [zlib.constants.BROTLI_PARAM_SIZE_HINT]: body.length
+        }
+    }),
+    gzip: body => zlib.gzipSync(body, { level: 9 })
+};
+
+module.exports = {
+    /**
+     * Wraps a served body with its strong ETag. Compressed copies are added
+     * to the variant the first time a client asks for them.
+     */
+    create: function (body) {
+        const buffer = Buffer.isBuffer(body) ? body : Buffer.from(body, 'utf8');
+        const hash = crypto.createHash('sha256').update(buffer).digest('base64url').slice(0, 27);
+        return { body: buffer, hash, encoded: {} };
+    },
+
+    /**
+     * Answers with 304 when the client already has the variant, otherwise
+     * sends the best precompressed copy it accepts.
+     */
+    send: function (req, res, variant) {
+        const encoding = variant.body.length ? req.acceptsEncodings('br', 'gzip', 'identity') : 'identity';
+        const compressed = encoding === 'br' || encoding === 'gzip';
+
+        // A strong ETag names exactly one representation, so each encoding gets its own
+        res.set('ETag', `"${variant.hash}${compressed ? '-' + encoding : ''}"`);
+        res.set('Vary', 'Accept-Encoding');
+
+        if (req.fresh) {
+            return res.status(304).end();
+        }
+
+        if (!compressed) {
+            return res.status(200).send(variant.body);
+        }
+
+        if (!variant.encoded[encoding]) {
+            variant.encoded[encoding] = encoders[encoding](variant.body);
+        }
+        res.set('Content-Encoding', encoding);
+        return res.status(200).send(variant.encoded[encoding]);
+    }
+};
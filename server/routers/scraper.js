@@ -1,8 +1,7 @@
 const express = require('express')
-const { request } = require('undici') // undici is used for making HTTP requests
-const { parse } = require('node-html-parser'); // Used for parsing HTML
 const router = express.Router();
 const utils = require('../functions/utils');
+const telegram = require('../functions/telegram');
 
 
 router.get('/:channel', async (req, res) => {
@@ -11,37 +10,17 @@ router.get('/:channel', async (req, res) => {
     if (Number(requested) > 200) requested = 200
     const count = Math.ceil(Number(requested) / 20)
 
-    // Fetch the initial page of the Telegram channel
-    const { body, statusCode } = await request(`https://t.me/s/${req.params.channel}`)
-
-    if (statusCode === 302) {
-        return res.status(404).send({error: 'Channel didn\'t allow scraping'})
+    // The first page plus one more per 20 requested, as many as before
+    let configs
+    try {
+        configs = await telegram.getConfigs(req.params.channel, count + 1)
+    } catch (error) {
+        if (error instanceof telegram.ScrapeError) {
+            return res.status(error.status).send({error: error.message})
+        }
+        return res.status(502).send({error: 'Couldn\'t reach the channel'})
     }
 
-    const text = await body.text()
-    const html = parse(text)
-
-    // Extract message texts and the 'before' parameter for pagination
-    const widgets = html.querySelectorAll('.tgme_widget_message_text')
-    let before = html.querySelector('.tme_messages_more')['_attrs']['data-before']
-    let msgs = widgets.map(item => item.innerText).reverse()
-
-    // Fetch additional pages if needed
-    for (const i of new Array(count)) {
-        const { body } = await request(`https://t.me/s/${req.params.channel}?before=${before}`)
-        const text = await body.text()
-        const html = parse(text)
-        const widgets = html.querySelectorAll('.tgme_widget_message_text')
-        before = html.querySelector('.tme_messages_more')['_attrs']['data-before']
-        msgs = [...msgs, ...widgets.map(item => item.innerText).reverse()]
-    }
-
-    // Regular expression to match VPN configuration URLs
-    const pattern = /(?:vless|wireguard|vmess|ss|trojan):\/\/[^\s#]+(?:#[^\s]*)?/g;
-
-    // Extract VPN configs from messages, filter out null matches, and replace HTML entities
-    const configs = msgs.flatMap(str => str.match(pattern)).filter(item => item).map(str => str.replaceAll('&amp;', '&'))
-
     // Filter configs based on the protocol query parameter (if provided)
     const protocolFiltered = configs.filter(config => !req.query.protocol || config.startsWith(req.query.protocol))
 
@@ -1,12 +1,17 @@
 const express = require('express')
-const fs = require('node:fs');
 const path = require('node:path')
 const router = express.Router()
 const utils = require('../functions/utils');
+const published = require('../functions/published');
+const compact = require('../functions/compact');
+const cache = require('../functions/cache');
+const variants = require('../functions/variant');
+const locationIndex = require('../functions/locationIndex');
+const logger = require('../functions/logger');
 
 router.get('/:name', async (req, res) => {
     const folderPath = path.join(process.cwd(), 'proxies', 'v2ray');
-    const v2rayFiles = fs.readdirSync(folderPath);
+    const v2rayFiles = cache.list(folderPath);
     const fileName = v2rayFiles.find(file => (file === req.params.name) || (file.split('.')[0] === req.params.name));
 
     if (!fileName) {
@@ -14,78 +19,59 @@ router.get('/:name', async (req, res) => {
         return res.status(404).send({ error: 'File not found' });
     }
 
-    const filePath = path.join(folderPath, fileName);
-    const fileContent = fs.readFileSync(filePath, { encoding: 'utf8' });
-    const configs = fileContent.split('\n');
-    const protocolFiltered = configs.filter(config => !req.query.protocol || config.startsWith(req.query.protocol));
-    const amount = Number(req.query.amount) || Number(req.query.limit) || Number(req.query.count) || -1;
-    const sliced = protocolFiltered.slice(0, amount);
-    const joined = sliced.join('\n\n');
+    const amount = Number(req.query.amount) || Number(req.query.limit) || Number(req.query.count) || undefined;
+    const decrypted = req.query.decrypted == '' || req.query.decrypted;
 
-    utils.setHeaders(res, `Github: M-logique/Proxies | ${req.params.name.toUpperCase().replaceAll("-", " ")}`, true);
+    // Parsed, filtered and encoded once per file version
+    const variant = cache.body(path.join(folderPath, fileName), req.query.protocol, amount, !decrypted);
+    if (!variant) {
+        return res.status(404).send({ error: 'File not found' });
+    }
 
-    if (req.query.decrypted == '' || req.query.decrypted) {
-        res.status(200).send(joined);
-    } else {
-        const encrypted = utils.b64encode(joined);
-        res.status(200).send(encrypted);
-    }    
+    utils.setHeaders(res, `Github: M-logique/Proxies | ${req.params.name.toUpperCase().replaceAll("-", " ")}`, true);
+    variants.send(req, res, variant);
 });
 
 router.get('/location/:location', async (req, res) => {
-    let json = require('../../proxies/byLocation.json')
-    json = Object.assign({}, json.profilesByCountryCode, json.profilesByCountryName)
-    json["Netherlands"] = [].concat(
-        json["Netherlands"] || [],
-        json["The Netherlands"] || []
-      );
-    json = lowerize(json)
-
-    const loc = req.params.location.toLowerCase();
-
-    const configs = json[loc]
-
-    const name = utils.getName(req.params.location).replaceAll('-', '');
-    const flag = utils.getFlag(req.params.location);
-
-    if (!configs) {
+    // Every code and name alias resolves to its profiles and display metadata in one lookup
+    const entry = locationIndex.lookup(req.params.location);
+    if (!entry) {
         return res.status(404).send({ error: 'File not found' });
     }
-    
-    const protocolFiltered = configs.filter(config => !req.query.protocol || config.startsWith(req.query.protocol));
-    const amount = Number(req.query.amount) || Number(req.query.limit) || Number(req.query.count) || -1;
-    const sliced = protocolFiltered.slice(0, amount);
-    const joined = sliced.join('\n\n');
 
-    utils.setHeaders(res, `${flag} Github: M-logique/Proxies | ${name}`);
+    const amount = Number(req.query.amount) || Number(req.query.limit) || Number(req.query.count) || undefined;
+    const decrypted = req.query.decrypted == '' || req.query.decrypted;
 
-    if (req.query.decrypted == '' || req.query.decrypted) {
-        res.status(200).send(joined);
-    } else {
-        const encrypted = utils.b64encode(joined);
-        res.status(200).send(encrypted);
-    }    
+    // Serve the precomputed body when publish.py wrote this variant
+    const file = published.lookup(req.params.location, req.query.protocol, amount, !decrypted);
+    const variant = (file && cache.file(file.path))
+        || locationIndex.body(entry, req.query.protocol, amount, !decrypted);
 
+    utils.setHeaders(res, entry.title);
+    variants.send(req, res, variant);
 })
 
 router.get('/', async (req,res) => {
     const folderPath = path.join(process.cwd(), 'proxies', 'v2ray')
-    const v2rayFiles = fs.readdirSync(folderPath);
+    const v2rayFiles = cache.list(folderPath);
     const mapped = v2rayFiles.map(file => file.split('.')[0] || file);
-    const json = require('../../proxies/byLocation.json')
-    const arr = [...json.locations.byCountryCode, ...json.locations.byNames].map(item => 'location/'+item)
+    const locations = compact.load();
+    const codes = locations.countries.map(([code]) => code);
+    const names = locations.countries.flatMap(([, ...names]) => names);
+    const arr = [...codes, ...names].map(item => 'location/'+item)
     const all = [...mapped, ...arr]
     const joined = all.join(', ');
     res.status(200).send(`available endpoints: ${joined}`);
 });
 
+// Build the location index up front so its cost shows in the startup log
+try {
+    locationIndex.get();
+} catch (err) {
+    logger.warn(`Location index not built: ${err.message}`);
+}
+
 module.exports = {
     path: '/proxies/v2ray',
     router: router
 }
-
-const lowerize = (obj) =>
-    Object.keys(obj).reduce((acc, k) => {
-      acc[k.toLowerCase()] = obj[k];
-      return acc;
-}, {});
\ No newline at end of file
@@ -13,6 +13,8 @@ It allows Python programs to call Go code that performs resource-fetching and ot
 extern "C" {
     char* FetchResources();
     char* FetchTGChannels(const char* data);
+    void StreamResources(int fd);
+    void StreamTGChannels(const char* data, int fd);
 }
 
 string fetch_resources() {
@@ -29,10 +31,24 @@ string fetch_tg_channels(const string& data) {
     return channels;
 }
 
+// The streaming variants write one JSON record per line to `fd` and close it when done.
+// The GIL is released so Python can read the records while Go is still fetching.
+void stream_resources(int fd) {
+    py::gil_scoped_release release;
+    StreamResources(fd);
+}
+
+void stream_tg_channels(const string& data, int fd) {
+    py::gil_scoped_release release;
+    StreamTGChannels(data.c_str(), fd);
+}
+
 PYBIND11_MODULE(resources, m) {
     m.doc() = "Python bindings for resource-fetching operations";
     
 
     m.def("fetch_resources", &fetch_resources, "Fetches resources and returns them as a JSON string.");
     m.def("fetch_tg_channels", &fetch_tg_channels, py::arg("data"), "Fetches Telegram channels using input data.");
+    m.def("stream_resources", &stream_resources, py::arg("fd"), "Fetches resources and writes them to fd as newline-delimited JSON, closing it when done.");
+    m.def("stream_tg_channels", &stream_tg_channels, py::arg("data"), py::arg("fd"), "Fetches Telegram channels and writes them to fd as newline-delimited JSON, closing it when done.");
 }
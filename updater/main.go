@@ -6,15 +6,20 @@ package main
 import "C"
 
 import (
+	"bytes"
 	"crypto/aes"
 	"crypto/cipher"
+	"crypto/sha1"
 	"encoding/base64"
+	"encoding/hex"
 	"encoding/json"
 	"fmt"
 	"io"
 	"log"
 	"net/http"
+	neturl "net/url"
 	"os"
+	"path/filepath"
 	"regexp"
 	"strings"
 	"sync"
@@ -36,6 +41,101 @@ type Channel struct {
 }
 
 var client = &http.Client{}
+
+// Record/replay harness (see .github/harness.py).
+// PROXIES_HARNESS=record saves every response into PROXIES_ARCHIVE,
+// PROXIES_HARNESS=replay sends every request to the stand-in server at PROXIES_REPLAY_URL.
+const harnessURLHeader = "X-Harness-URL"
+
+type harnessTransport struct {
+	base      http.RoundTripper
+	mode      string
+	archive   string
+	replayURL *neturl.URL
+}
+
+type harnessExchange struct {
+	Method  string              `json:"method"`
+	URL     string              `json:"url"`
+	Status  int                 `json:"status"`
+	Headers map[string][]string `json:"headers"`
+	Body    string              `json:"body"`
+}
+
+// harnessKey must match `archive_key` in .github/harness.py
+func harnessKey(method, rawURL string) string {
+	sum := sha1.Sum([]byte(method + " " + rawURL))
+	return hex.EncodeToString(sum[:])
+}
+
+func (t *harnessTransport) RoundTrip(req *http.Request) (*http.Response, error) {
+	original := req.URL.String()
+
+	if t.mode == "replay" {
+		req = req.Clone(req.Context())
+		req.URL.Scheme = t.replayURL.Scheme
+		req.URL.Host = t.replayURL.Host
+		req.Host = t.replayURL.Host
+		req.Header.Set(harnessURLHeader, original)
+		return t.base.RoundTrip(req)
+	}
+
+	resp, err := t.base.RoundTrip(req)
+	if err != nil {
+		return resp, err
+	}
+
+	body, err := io.ReadAll(resp.Body)
+	resp.Body.Close()
+	if err != nil {
+		return nil, err
+	}
+	resp.Body = io.NopCloser(bytes.NewReader(body))
+
+	exchange, _ := json.Marshal(harnessExchange{
+		Method:  req.Method,
+		URL:     original,
+		Status:  resp.StatusCode,
+		Headers: resp.Header,
+		Body:    base64.StdEncoding.EncodeToString(body),
+	})
+	path := filepath.Join(t.archive, harnessKey(req.Method, original)+".json")
+	if err := os.WriteFile(path, exchange, 0o644); err != nil {
+		log.Println("Failed to record response:", err)
+	}
+
+	return resp, nil
+}
+
+func init() {
+	mode := os.Getenv("PROXIES_HARNESS")
+	if mode != "record" && mode != "replay" {
+		return
+	}
+
+	transport := &harnessTransport{
+		base:    http.DefaultTransport,
+		mode:    mode,
+		archive: os.Getenv("PROXIES_ARCHIVE"),
+	}
+
+	if mode == "replay" {
+		replayURL, err := neturl.Parse(os.Getenv("PROXIES_REPLAY_URL"))
+		if err != nil || replayURL.Host == "" {
+			log.Println("Invalid PROXIES_REPLAY_URL, harness disabled")
+			return
+		}
+		transport.replayURL = replayURL
+	} else if err := os.MkdirAll(transport.archive, 0o755); err != nil {
+		log.Println("Failed to create the harness archive, harness disabled:", err)
+		return
+	}
+
+	// Every client in this package uses the default transport
+	http.DefaultTransport = transport
+	log.Printf("Harness enabled in %s mode", mode)
+}
+
 const V2rayRegex = `(?:vless|vmess|ss|trojan):\/\/[^\n#]+(?:#[^\n]*)?`
 
 func loadAdditionalV2rayURLs(slice *[]string) {
@@ -334,9 +434,39 @@ func fetchURLs(urls []string) []string {
 	return results
 }
 
-// export FetchResources - fetches resources and returns them as a JSON string
-//export FetchResources
-func FetchResources() *C.char {
+// recordWriter writes resources as newline-delimited JSON records to a file descriptor
+type recordWriter struct {
+	mu      sync.Mutex
+	file    *os.File
+	encoder *json.Encoder
+}
+
+func newRecordWriter(fd C.int) *recordWriter {
+	file := os.NewFile(uintptr(fd), "records")
+	return &recordWriter{
+		file:    file,
+		encoder: json.NewEncoder(file),
+	}
+}
+
+// Write sends a single resource as one line
+func (w *recordWriter) Write(resource Resource) {
+	w.mu.Lock()
+	defer w.mu.Unlock()
+
+	if err := w.encoder.Encode(resource); err != nil {
+		log.Printf("Failed to write record for %s: %s", resource.Name, err)
+	}
+}
+
+// Close closes the file descriptor, which tells the reader that no more records are coming
+func (w *recordWriter) Close() {
+	w.file.Close()
+}
+
+// collectResources fetches every resource and sends it to resourceChan as soon as it's ready.
+// The channel is closed once all sources are done.
+func collectResources(resourceChan chan Resource) {
 	httpResources := []string{
 		"https://api.proxyscrape.com/?request=displayproxies&proxytype=http",
 		"https://www.proxy-list.download/api/v1/get?type=http",
@@ -449,13 +579,16 @@ func FetchResources() *C.char {
 
 	// loadAdditionalV2rayURLs(&v2rayResources)
 
-	var allResources []Resource
 	var wg sync.WaitGroup
-	resourceChan := make(chan Resource)
 
 	// fetch resources and send them to channel
 	fetchAndSend := func(urls []string, name, filePath string, regexPattern string, prefix string) {
 		defer wg.Done()
+		defer func() {
+			if r := recover(); r != nil {
+				log.Printf("Recovered a crash while fetching %s: %v", name, r)
+			}
+		}()
 		contents := fetchURLsInChunks(urls)
 		parsedTexts := parseText(prefix, regexPattern, strings.Join(contents, "\n"))
 
@@ -507,6 +640,15 @@ func FetchResources() *C.char {
 		wg.Wait()
 		close(resourceChan)
 	}()
+}
+
+// export FetchResources - fetches resources and returns them as a JSON string
+//export FetchResources
+func FetchResources() *C.char {
+	var allResources []Resource
+	resourceChan := make(chan Resource)
+
+	go collectResources(resourceChan)
 
 	// Collect results from channel
 	for resource := range resourceChan {
@@ -523,6 +665,20 @@ func FetchResources() *C.char {
 	return C.CString(string(jsonData))
 }
 
+// export StreamResources - fetches resources and writes each one to fd as a JSON line as soon as it's ready
+//export StreamResources
+func StreamResources(fd C.int) {
+	writer := newRecordWriter(fd)
+	defer writer.Close()
+
+	resourceChan := make(chan Resource)
+	go collectResources(resourceChan)
+
+	for resource := range resourceChan {
+		writer.Write(resource)
+	}
+}
+
 
 func fetchTGMessages(channelID string, requested int) []string {
 	var messages []string
@@ -632,15 +788,18 @@ func stripHTML(input string) string {
 	return re.ReplaceAllString(input, "")
 }
 
-//export FetchTGChannels
-func FetchTGChannels(data *C.char) *C.char {
-	resourcesChan := make(chan Resource, 100)
-	goData := C.GoString(data)
-
+// collectTGChannels fetches every channel in the JSON data and sends it to resourcesChan as
+// soon as it's ready. The channel is closed once all channels are done.
+func collectTGChannels(goData string, resourcesChan chan Resource) error {
 	var wg sync.WaitGroup
 
 	fetchAndSend := func(channelID string, amount int, filepath string) {
 		defer wg.Done()
+		defer func() {
+			if r := recover(); r != nil {
+				log.Printf("Recovered a crash while fetching %s: %v", channelID, r)
+			}
+		}()
 		tgMessages := fetchTGMessages(channelID, amount)
 
 		rawContents := strings.Join(tgMessages, "\n")
@@ -658,7 +817,8 @@ func FetchTGChannels(data *C.char) *C.char {
 
 	err := json.Unmarshal([]byte(goData), &rawData)
 	if err != nil {
-		log.Fatalf("Failed to read json: %v", err)
+		close(resourcesChan)
+		return err
 	}
 
 	for channelID, data := range rawData {
@@ -675,6 +835,18 @@ func FetchTGChannels(data *C.char) *C.char {
 		close(resourcesChan)
 	}()
 
+	return nil
+}
+
+//export FetchTGChannels
+func FetchTGChannels(data *C.char) *C.char {
+	resourcesChan := make(chan Resource, 100)
+	goData := C.GoString(data)
+
+	if err := collectTGChannels(goData, resourcesChan); err != nil {
+		log.Fatalf("Failed to read json: %v", err)
+	}
+
 	var allResources []Resource
 	for resource := range resourcesChan {
 		allResources = append(allResources, resource)
@@ -688,4 +860,22 @@ func FetchTGChannels(data *C.char) *C.char {
 	return C.CString(string(jsonData))
 }
 
+//export StreamTGChannels
+func StreamTGChannels(data *C.char, fd C.int) {
+	writer := newRecordWriter(fd)
+	defer writer.Close()
+
+	resourcesChan := make(chan Resource, 100)
+	goData := C.GoString(data)
+
+	if err := collectTGChannels(goData, resourcesChan); err != nil {
+		log.Printf("Failed to read json: %v", err)
+		return
+	}
+
+	for resource := range resourcesChan {
+		writer.Write(resource)
+	}
+}
+
 func main() {}
@@ -1,12 +1,13 @@
 # Standard library imports
 import asyncio
+import hashlib
 import json
 import logging
 import os
 import sys
+import time
 import importlib.util
-from re import findall
-from typing import List, Dict, Optional
+from typing import Any, AsyncIterator, Callable, List, Dict, Optional, Set, Tuple
 
 # Logging imports
 from logging import Logger, INFO, Formatter, StreamHandler, FileHandler, DEBUG
@@ -40,6 +41,36 @@ resources = importlib.util.module_from_spec(spec)
 sys.modules[module_name] = resources
 spec.loader.exec_module(resources)
 
+# Shared helpers live next to the other workflow scripts in .github
+sys.path.insert(0, os.path.join(os.path.dirname(root_dir), ".github"))
+from extractor import iter_configs
+from fingerprint import fingerprint
+from inventory import Inventory
+
+# Persistent index of every config seen, across sources and runs
+SEEN_INDEX_PATH = f"{workflow_dir}/data/seen_index.json"
+
+# SQLite inventory of configs, their sources and check history
+INVENTORY_PATH = f"{workflow_dir}/data/inventory.sqlite3"
+
+# Entries not seen for this long are dropped from the index (default: 3 days)
+SEEN_MAX_AGE = 3 * 24 * 60 * 60
+
+# Output folders whose configs go through the global index
+INDEXED_DIRS = ("/proxies/v2ray/", "/proxies/tvc/")
+
+# Config lists written by the workflow scripts, and where their unique configs end up
+ADDITIONAL_FILES = (
+	("additional_configs.txt", "./proxies/tvc/mixed.txt"),
+	("subscription_configs.txt", "./proxies/v2ray/subscriptions.txt"),
+)
+
+# Upper bound for a single streamed record, a channel's rawResults can be several MB
+RECORD_LIMIT = 256 * 1024 * 1024
+
+# Output folders owned by the updater, stale files in them are pruned after a run
+OUTPUT_DIRS = ("./proxies/v2ray", "./proxies/tvc", "./proxies/regular")
+
 
 class CustomLogger(Logger):
 	"""Custom logger with console and file output, and formatted messages."""
@@ -118,52 +149,312 @@ def remove_duplicates(items: List[str]) -> List[str]:
 	return [item for item in items if not (item in seen_items or seen_items.add(item))]
 
 
-def dump(filepath: str, text: str) -> None:
-	"""Writes text data to a specified file synchronously."""
-	# Make the directory if it doesn't exist
-	os.makedirs(os.path.dirname(filepath), exist_ok = True)
+class SeenIndex:
+	"""
+	Global index of configs keyed by fingerprint, persisted between runs.
+
+	Each entry is stored as ``[first_seen, last_seen, [source ids], owner id]``
+	and source names are kept once in a separate table, so the file stays
+	compact. The owner is the source that wrote the config last run. It keeps
+	the config as long as it still delivers it, whatever order the sources
+	arrive in, so configs don't move between files from run to run.
+	"""
+	def __init__(self, filepath: str, max_age: int = SEEN_MAX_AGE):
+		self.filepath = filepath
+		self.max_age = max_age
+		self.now = int(time.time())
+		self.sources: List[str] = []
+		self.source_ids: Dict[str, int] = {}
+		self.entries: Dict[str, list] = {}
+		
+		# Fingerprints already written during this run
+		self.written: Set[str] = set()
+		
+		# Sources processed so far in this run
+		self.delivered: Set[int] = set()
+		
+		# Configs held back for an owner that hasn't come in yet, as (source, filepath, config)
+		self.deferred: Dict[str, Tuple[str, str, str]] = {}
+		
+		self.load()
 	
-	# Open the specified file in write mode ('w')
-	with open(filepath, "w") as fp:
-		# Log a debug message indicating the file is being written to
-		logger.debug("Writing to file: %s", filepath)
+	def load(self) -> None:
+		"""Loads the index from disk, starting empty if it is missing or broken."""
+		if not os.path.exists(self.filepath):
+			return
 		
-		# Convert the 'text' to a string (if it's not already) and write it to the file
-		fp.write(str(text))
+		try:
+			with open(self.filepath) as fp:
+				data = json.load(fp)
+			
+			self.sources = data.get("sources", [])
+			self.source_ids = {name: i for i, name in enumerate(self.sources)}
+			self.entries = data.get("entries", {})
+		except (OSError, ValueError) as error:
+			logger.warning("Could not load seen index, starting fresh: %s", error)
+	
+	def source_id(self, name: str) -> int:
+		"""Returns the id of a source name, registering it if needed."""
+		if name not in self.source_ids:
+			self.source_ids[name] = len(self.sources)
+			self.sources.append(name)
+		return self.source_ids[name]
+	
+	def add(self, config: str, source: str, filepath: str) -> bool:
+		"""
+		Records a config from a source and returns True if the source should write it.
 
+		A config owned by another source that hasn't been processed yet is held
+		back for it, `orphans` hands it out if the owner never delivers it.
+		"""
+		key = fingerprint(config)
+		sid = self.source_id(source)
+		
+		entry = self.entries.get(key)
+		if entry is None:
+			entry = self.entries[key] = [self.now, self.now, [sid], None]
+		else:
+			entry[1] = self.now
+			if sid not in entry[2]:
+				entry[2].append(sid)
+			if len(entry) < 4:
+				# Written before owners were recorded
+				entry.append(None)
+		
+		if key in self.written:
+			return False
+		
+		owner = entry[3]
+		if owner is not None and owner != sid and owner not in self.delivered:
+			held = self.deferred.get(key)
+			if held is None or source < held[0]:
+				self.deferred[key] = (source, filepath, config)
+			return False
+		
+		self.written.add(key)
+		entry[3] = sid
+		return True
+	
+	def filter(self, configs: List[str], source: str, filepath: str) -> List[str]:
+		"""Returns the configs the source writes to filepath: not written yet and not owned by another source."""
+		self.delivered.add(self.source_id(source))
+		return [config for config in (c.strip() for c in configs) if config and self.add(config, source, filepath)]
+	
+	def orphans(self) -> Dict[str, List[str]]:
+		"""
+		Hands the configs held back for an owner that never delivered them to
+		the source that held them, alphabetically first if several did.
 
-async def fetch_resources_and_dump() -> None:
-	"""Fetches resources, parse JSON, and dump results to file."""
-	try:
-		# Fetch raw JSON data from an external resource function
-		json_data = resources.fetch_resources()
+		:return: The configs to add to each file, sorted.
+		"""
+		files: Dict[str, List[str]] = {}
+		for key, (source, filepath, config) in self.deferred.items():
+			if key in self.written:
+				continue
+			self.written.add(key)
+			self.entries[key][3] = self.source_id(source)
+			files.setdefault(filepath, []).append(config)
 		
-		# Parse the fetched JSON data into a Python data structure (list of dictionaries)
-		parsed_data = json.loads(json_data)
+		self.deferred.clear()
+		return {filepath: sorted(configs) for filepath, configs in files.items()}
+	
+	def save(self) -> None:
+		"""Ages out stale entries and writes the index back to disk."""
+		cutoff = self.now - self.max_age
+		entries = {key: entry for key, entry in self.entries.items() if entry[1] >= cutoff}
 		
-		# Iterate over each resource entry in the parsed data
-		for data in parsed_data:
-			# Extract the 'name' field for logging purposes
-			name = data.get("name")
-			
-			# Get the 'rawResults' field and split it into individual lines
-			raw_results = data.get("rawResults").splitlines()
-			
-			# Remove duplicate entries from 'raw_results' and join them back into a single string
-			joined_results = "\n".join(remove_duplicates(raw_results))
-			
-			# Construct the file path where the cleaned results will be saved
-			filepath = "." + data.get("filepath")
-			
-			# Save the cleaned and processed results to the specified file
-			dump(filepath, joined_results)
+		# Compact the source table down to the sources still referenced
+		used = sorted({sid for entry in entries.values() for sid in entry[2]})
+		remap = {sid: i for i, sid in enumerate(used)}
+		for entry in entries.values():
+			entry[2] = [remap[sid] for sid in entry[2]]
+			if len(entry) > 3 and entry[3] is not None:
+				# The owner always delivered the config at some point, so it's in entry[2]
+				entry[3] = remap[entry[3]]
+		
+		data = {
+			"version": 2,
+			"sources": [self.sources[sid] for sid in used],
+			"entries": entries
+		}
+		
+		os.makedirs(os.path.dirname(self.filepath), exist_ok = True)
+		tmp_path = self.filepath + ".tmp"
+		with open(tmp_path, "w") as fp:
+			json.dump(data, fp, separators = (",", ":"))
+		os.replace(tmp_path, self.filepath)
+		
+		logger.info("Seen index saved: %d configs (%d new this run, %d aged out)",
+		            len(entries),
+		            sum(1 for entry in entries.values() if entry[0] == self.now),
+		            len(self.entries) - len(entries))
+
+
+# Shared across every channel and resource processed in this run
+seen_index = SeenIndex(SEEN_INDEX_PATH)
+
+
+class DumpReport:
+	"""Keeps track of the files written by `dump` during a run."""
+	def __init__(self):
+		self.changed = 0
+		self.unchanged = 0
+		self.touched: Set[str] = set()
+	
+	def record(self, filepath: str, changed: bool) -> None:
+		"""Records the outcome of a single dump."""
+		self.touched.add(os.path.abspath(filepath))
+		if changed:
+			self.changed += 1
+		else:
+			self.unchanged += 1
+	
+	def prune_stale(self, folders: tuple = OUTPUT_DIRS) -> int:
+		"""
+		Removes .txt files that were not produced by this run.
+
+		Only folders that received at least one dump are pruned, so a source
+		that failed completely keeps its previous files. Temporary files left
+		by a run killed mid-dump are removed from every folder.
+		"""
+		removed = 0
+		for folder in folders:
+			folder = os.path.abspath(folder)
+			if not os.path.isdir(folder):
+				continue
 			
-			# Log a success message indicating that data was successfully saved
-			logger.info("Dump success for %s", name)
+			pruned = any(os.path.dirname(path) == folder for path in self.touched)
+			for filename in os.listdir(folder):
+				path = os.path.join(folder, filename)
+				if filename.endswith(".tmp") or (pruned and filename.endswith(".txt") and path not in self.touched):
+					os.remove(path)
+					removed += 1
+					logger.debug("Removed stale file: %s", path)
+		return removed
+
+
+# Shared by every dump in this run
+dump_report = DumpReport()
+
+# Shared inventory, committed once the run is over
+inventory = Inventory(INVENTORY_PATH)
+
+
+def file_digest(filepath: str) -> Optional[bytes]:
+	"""Returns the SHA-256 digest of a file, or None if it can't be read."""
+	digest = hashlib.sha256()
+	try:
+		with open(filepath, "rb") as fp:
+			for block in iter(lambda: fp.read(1 << 16), b""):
+				digest.update(block)
+	except OSError:
+		return None
+	return digest.digest()
+
+
+def dump(filepath: str, text: str) -> bool:
+	"""
+	Writes text data to a specified file, skipping the write when the content is unchanged.
+
+	The new content is written to a temporary file and renamed into place, so an
+	interrupted run never leaves a truncated file behind.
+
+	:return: True if the file was written, False if it already had this content.
+	"""
+	# Make the directory if it doesn't exist
+	os.makedirs(os.path.dirname(filepath), exist_ok = True)
+	
+	# Convert the 'text' to a string (if it's not already) and encode it
+	data = str(text).encode("utf-8")
+	
+	# A size mismatch already tells us the file changed, only hash when it doesn't
+	if os.path.exists(filepath) and os.path.getsize(filepath) == len(data):
+		if file_digest(filepath) == hashlib.sha256(data).digest():
+			logger.debug("Unchanged, skipping: %s", filepath)
+			dump_report.record(filepath, changed = False)
+			return False
+	
+	# Log a debug message indicating the file is being written to
+	logger.debug("Writing to file: %s", filepath)
 	
-	# Handle JSON parsing errors, logging the issue for troubleshooting
-	except json.JSONDecodeError as error:
-		logger.error("Error decoding JSON: %s", error)
+	tmp_path = f"{filepath}.tmp"
+	with open(tmp_path, "wb") as fp:
+		fp.write(data)
+	os.replace(tmp_path, filepath)
+	
+	dump_report.record(filepath, changed = True)
+	return True
+
+
+async def stream_records(native_call: Callable[..., None], *args: Any) -> AsyncIterator[Dict]:
+	"""
+	Runs a streaming native call in a worker thread and yields its records as they arrive.
+
+	The native call writes one JSON record per line to the write end of a pipe and
+	closes it when done. A malformed record is logged and skipped.
+	"""
+	loop = asyncio.get_running_loop()
+	read_fd, write_fd = os.pipe()
+	
+	def run_native() -> None:
+		try:
+			native_call(*args, write_fd)
+		except Exception:
+			# The native side never got to close the pipe, do it so the reader sees EOF
+			os.close(write_fd)
+			raise
+	
+	native_task = loop.run_in_executor(None, run_native)
+	
+	reader = asyncio.StreamReader(limit = RECORD_LIMIT)
+	transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader),
+	                                            os.fdopen(read_fd, "rb", 0))
+	try:
+		while line := await reader.readline():
+			try:
+				yield json.loads(line)
+			except json.JSONDecodeError as error:
+				logger.error("Error decoding record: %s", error)
+	finally:
+		transport.close()
+		await native_task
+
+
+def process_resource(data: Dict) -> None:
+	"""Deduplicates a single resource and dumps it to its file."""
+	# Extract the 'name' field for logging purposes
+	name = data.get("name")
+	
+	# Get the 'rawResults' field and split it into individual lines
+	raw_results = data.get("rawResults").splitlines()
+	
+	# Construct the file path where the cleaned results will be saved
+	filepath = "." + data.get("filepath")
+	
+	# V2ray configs are deduplicated globally, regular proxies only within the resource
+	if data.get("filepath", "").startswith(INDEXED_DIRS):
+		results = seen_index.filter(raw_results, name, filepath)
+		inventory.add_configs(raw_results, name)
+		inventory.set_output(filepath, results)
+	else:
+		results = remove_duplicates(raw_results)
+		inventory.set_plain_output(filepath, results)
+	
+	# Save the cleaned and processed results to the specified file
+	dump(filepath, "\n".join(results))
+	
+	# Log a success message indicating that data was successfully saved
+	logger.info("Dump success for %s", name)
+
+
+async def fetch_resources_and_dump() -> None:
+	"""Streams resources from the native module and dumps each one as soon as it arrives."""
+	async for data in stream_records(resources.stream_resources):
+		# A broken resource must not stop the others from being saved
+		try:
+			process_resource(data)
+		except Exception as error:
+			logger.error("Failed to process resource %s: %s", data.get("name"), error)
 
 
 def read_channels_data(filepath: str) -> List[Dict]:
@@ -180,16 +471,12 @@ def read_channels_data(filepath: str) -> List[Dict]:
 		return []
 
 
-def extract_urls(raw_content: str) -> str:
-	"""Extracts and return the URLs from raw content based on a pattern."""
-	# Define a regular expression pattern to match various types of URLs (vless, vmess, ss, trojan)
-	pattern = r'(?:vless|vmess|ss|trojan)://[^\s#]+(?:#[^\s]*)?'
-	
-	# Find all matches of the pattern in the 'raw_content' and reverse their order
-	urls = findall(pattern, raw_content)[::-1]
-	
-	# Join the extracted URLs into a single string, each separated by a newline
-	return '\n'.join(urls)
+def extract_urls(raw_content: str) -> List[str]:
+	"""Extracts and return the share links from raw content, newest first."""
+	# Single pass over the content, only the links themselves are kept in memory
+	urls = list(iter_configs(raw_content))
+	urls.reverse()
+	return urls
 
 
 def process_item(item: Dict, filepath: str) -> None:
@@ -197,21 +484,44 @@ def process_item(item: Dict, filepath: str) -> None:
 	# Extract the "rawResults" field from the 'item' dictionary, defaulting to an empty string if it doesn't exist
 	raw_content = item.get("rawResults", "")
 	
-	# Extract URLs from the 'raw_content' using a custom 'extract_urls' function
-	urls = extract_urls(raw_content)
+	# Extract URLs from the 'raw_content' and keep only those no other source writes
+	extracted = extract_urls(raw_content)
+	urls = seen_index.filter(extracted, item.get("name"), filepath)
+	
+	# Every source is recorded in the inventory, even when another one writes the config
+	inventory.add_configs(extracted, item.get("name"))
 	
-	# Check if the extracted 'urls' is not empty or contains non-whitespace characters
-	if urls.strip():
+	# Check if any URL is left after the global deduplication
+	if urls:
+		inventory.set_output(filepath, urls)
+		
 		# Save the 'urls' content to a specified 'filepath' using the 'dump' function
-		dump(filepath, urls)
+		dump(filepath, "\n".join(urls))
 		
 		# Log an info message indicating a successful dump, including the item name for context
 		logger.info("Dump successful for %s", item.get("name"))
 	else:
+		inventory.drop_output(filepath)
+		
 		# Log a warning message if the 'urls' extraction result is empty, indicating failure
 		logger.warning("Unsuccessful dump for %s due to empty result", item.get("name"))
 
 
+def dump_orphans() -> None:
+	"""Appends the configs whose owner didn't deliver them this run to the files of the sources that held them back."""
+	for filepath, configs in seen_index.orphans().items():
+		lines: List[str] = []
+		# Only a file written in this run is extended, an older one is stale
+		if os.path.abspath(filepath) in dump_report.touched:
+			with open(filepath) as fp:
+				lines = [line for line in fp.read().splitlines() if line]
+		
+		lines += configs
+		inventory.set_output(filepath, lines)
+		dump(filepath, "\n".join(lines))
+		logger.info("Added %d configs their owner didn't deliver to %s", len(configs), filepath)
+
+
 async def fetch_tg_channels() -> None:
 	"""Fetches Telegram channels and dump relevant URLs."""
 	tg_channels_file = f"{workflow_dir}/data/tgchannels.json"
@@ -229,16 +539,14 @@ async def fetch_tg_channels() -> None:
 	# Convert the 'channels' data into a JSON-formatted string
 	json_data = json.dumps(channels)
 	
-	# Fetch the Telegram channels data using a resource function, passing the JSON data
-	data = resources.fetch_tg_channels(json_data)
-	
-	# Parse the JSON response received from the 'fetch_tg_channels' function into a Python dictionary
-	parsed_data = json.loads(data)
-	
-	# Process each parsed item
-	for item in parsed_data:
-		filepath = "." + item.get("filepath")
-		process_item(item, filepath)
+	# Stream the channels from the native module, each one is processed as soon as it arrives
+	async for item in stream_records(resources.stream_tg_channels, json_data):
+		# A broken channel must not stop the others from being saved
+		try:
+			filepath = "." + item.get("filepath")
+			process_item(item, filepath)
+		except Exception as error:
+			logger.error("Failed to process channel %s: %s", item.get("name"), error)
 
 
 async def main():
@@ -260,12 +568,34 @@ async def main():
 			else:
 				logger.info("Task %d completed successfully.", index + 1)
 	
-		if os.path.exists("additional_configs.txt"):
-			with open("additional_configs.txt", "r") as fp:
-				configs = fp.readlines()
-
-			with open("proxies/tvc/mixed.txt", "a") as fp:
-				fp.write("\n".join(configs))
+		for source_file, filepath in ADDITIONAL_FILES:
+			if not os.path.exists(source_file):
+				continue
+			
+			with open(source_file, "r") as fp:
+				lines = fp.read().splitlines()
+			
+			configs = seen_index.filter(lines, os.path.splitext(source_file)[0], filepath)
+			inventory.add_configs(lines, os.path.splitext(source_file)[0])
+			inventory.set_output(filepath, configs)
+			
+			# Only configs no channel or resource has written already end up here
+			dump(filepath, "\n".join(configs))
+		
+		# Every source is in, what an owner didn't deliver goes to another source that has it
+		dump_orphans()
+		
+		# Persist the index so first/last seen times and sources carry over
+		seen_index.save()
+		
+		checks, configs = inventory.prune()
+		logger.info("Inventory saved: %d old checks and %d stale configs dropped", checks, configs)
+		
+		# Drop files from sources that produced nothing this time
+		removed = dump_report.prune_stale()
+		
+		logger.info("Dump summary: %d changed, %d unchanged, %d stale removed",
+		            dump_report.changed, dump_report.unchanged, removed)
 		
 	except asyncio.CancelledError:
 		# Handle cases where the tasks are cancelled
@@ -274,6 +604,9 @@ async def main():
 	except Exception as error:
 		# Catch any unexpected errors during execution
 		logger.error("An unexpected error occurred during execution: %s", error)
+	
+	finally:
+		inventory.close()
 
 
 # Run the main asynchronous function